@@ -0,0 +1,94 @@
+import numpy as np
+from sklearn.cluster import KMeans
+
+from embedding import fit_components, normalize_rows, project
+
+
+class IVFIndex:
+    # Inverted-file ANN index over a TruncatedSVD projection of the TF-IDF
+    # rows. Every category gets its own k-means coarse quantizer, so a query
+    # only probes lists of its own category. Knobs:
+    #   n_components  SVD dims used for routing (memory vs routing quality)
+    #   nlist         lists per category; default ~sqrt(category size)
+    #   nprobe        lists scanned per query (recall vs latency)
+    # Candidates are re-scored exactly against the TF-IDF rows by the engine.
+
+    def __init__(self, n_components=128, nlist=None, nprobe=8,
+                 max_train=50_000, chunk_size=50_000, random_state=0):
+        self.n_components = n_components
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.max_train = max_train
+        self.chunk_size = chunk_size
+        self.random_state = random_state
+
+    def params(self):
+        return {"n_components": self.n_components, "nlist": self.nlist, "nprobe": self.nprobe}
+
+    def build(self, tfidf_matrix, category_rows):
+        rng = np.random.default_rng(self.random_state)
+        n_rows = tfidf_matrix.shape[0]
+
+        # SVD fitted on a sample, applied to all rows in chunks
+        train = rng.choice(n_rows, size=min(n_rows, self.max_train), replace=False)
+        self.components = fit_components(tfidf_matrix[np.sort(train)], self.n_components,
+                                         self.random_state)
+        self.embeddings = project(tfidf_matrix, self.components, chunk_size=self.chunk_size)
+        n_components = len(self.components)
+
+        centroids, list_sizes, list_rows, cat_lists = [], [], [], [0]
+        for rows in category_rows:
+            n_lists = self.nlist or int(round(np.sqrt(len(rows))))
+            n_lists = max(1, min(n_lists, len(rows)))
+            emb = self.embeddings[rows]
+            if n_lists == 1:
+                labels = np.zeros(len(rows), dtype=np.int64)
+                cents = emb.mean(axis=0, keepdims=True)
+            else:
+                sample = rng.choice(len(rows), size=min(len(rows), self.max_train), replace=False)
+                km = KMeans(n_clusters=n_lists, n_init=1, max_iter=20,
+                            random_state=self.random_state).fit(emb[sample])
+                labels = km.predict(emb)
+                cents = km.cluster_centers_
+            order = np.argsort(labels, kind="stable")
+            centroids.append(normalize_rows(cents).astype(np.float32))
+            list_sizes.append(np.bincount(labels, minlength=n_lists))
+            list_rows.append(rows[order])
+            cat_lists.append(cat_lists[-1] + n_lists)
+
+        dims = n_components
+        self.centroids = np.vstack(centroids) if centroids else np.empty((0, dims), np.float32)
+        sizes = np.concatenate(list_sizes) if list_sizes else np.empty(0, np.int64)
+        self.list_offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+        self.list_rows = (np.concatenate(list_rows) if list_rows else np.empty(0)).astype(np.int32)
+        self.category_lists = np.asarray(cat_lists, dtype=np.int64)
+        return self
+
+    def candidates(self, index, code, nprobe=None):
+        nprobe = nprobe or self.nprobe
+        first, last = self.category_lists[code], self.category_lists[code + 1]
+        sims = self.centroids[first:last] @ self.embeddings[index]
+        if nprobe < len(sims):
+            probe = np.argpartition(-sims, nprobe - 1)[:nprobe]
+        else:
+            probe = np.arange(len(sims))
+        probe += first
+        starts, stops = self.list_offsets[probe], self.list_offsets[probe + 1]
+        return np.concatenate([self.list_rows[a:b] for a, b in zip(starts, stops)])
+
+    def arrays(self):
+        return {
+            "components": self.components,
+            "embeddings": self.embeddings,
+            "centroids": self.centroids,
+            "list_offsets": self.list_offsets,
+            "list_rows": self.list_rows,
+            "category_lists": self.category_lists,
+        }
+
+    @classmethod
+    def from_arrays(cls, params, arrays):
+        index = cls(**params)
+        for name, arr in arrays.items():
+            setattr(index, name, arr)
+        return index
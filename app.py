@@ -1,14 +1,16 @@
+import time
+run_start = time.perf_counter()
+
+# Only light modules load up front. scipy / scikit-learn come in with the
+# engine on the loader thread, matplotlib when a chart image is first drawn.
 import streamlit as st
 import streamlit.components.v1 as components
-from similarity_engine import SimilarityEngine
+from engine_loader import EngineLoader
+from filters import Filter, brands, exclude_brands, in_stock, min_rating, price_between
+from metrics import METRICS
+from rerank import Reranker
 import pandas as pd
-import numpy as np
-import re
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import matplotlib.colors as mcolors
-from sklearn.feature_extraction.text import TfidfVectorizer
+import charts
 from collections import Counter
 
 # ─── Page Config ───────────────────────────────────────────────────────────────
@@ -25,19 +27,11 @@ def clean_val(val, fallback="—"):
     s = str(val).strip()
     return fallback if s.lower() in ("nan","none","","n/a") else s
 
-def clean_category(val):
-    s = clean_val(val)
-    if s == "—": return "—"
-    s = re.sub(r"^\[[\"\']?", "", s)
-    s = re.sub(r"[\"\'].*$", "", s)
-    s = s.split(">>")[0].strip().strip('"').strip("'")
-    return s if s else "—"
-
 def clean_price(val):
-    try:
+    # Prices arrive as floats from the typed catalog (NaN when missing)
+    if val is not None and val > 0:
         f = float(val)
-        if f > 0: return f"₹{f:,.0f}", f
-    except: pass
+        return f"₹{f:,.0f}", f
     return None, None
 
 def clean_image(val):
@@ -143,50 +137,113 @@ html,body,[data-testid="stAppViewContainer"]{
 </style>""", unsafe_allow_html=True)
 
 # ─── Load Engine ───────────────────────────────────────────────────────────────
+# Started on a background thread by the first session and shared by every
+# later one; the shell (styles, sidebar) renders while it loads
 @st.cache_resource(show_spinner=False)
-def load_engine():
-    return SimilarityEngine("data/products_clean.csv")
+def engine_loader():
+    # Prebuilt artifacts (python build_index.py) load memory-mapped in milliseconds
+    return EngineLoader("data/engine", warm_modules=("matplotlib.figure",))
 
-with st.spinner("⚙️ Loading similarity engine…"):
-    engine = load_engine()
-df = engine.data
+loader = engine_loader()
+engine = None
 
 # ─── Session State ─────────────────────────────────────────────────────────────
-if "cat_history" not in st.session_state:
-    st.session_state.cat_history = []       # list of (product_name, category) tuples
+# Per-session state stays small: counts per category, not a search log
+if "cat_counts" not in st.session_state:
+    st.session_state.cat_counts = Counter()   # category -> searches
+    st.session_state.n_searches = 0
 if "last_tracked" not in st.session_state:
     st.session_state.last_tracked = None    # last product_name that was tracked
 
 # ─── Sidebar Analytics ─────────────────────────────────────────────────────────
 with st.sidebar:
     st.markdown("## 📊 Session Analytics")
-    if st.session_state.cat_history:
-        cat_names = [c for _, c in st.session_state.cat_history]
-        counts    = Counter(cat_names)
+    if st.session_state.n_searches:
+        counts    = st.session_state.cat_counts
         top3      = counts.most_common(3)
         medals    = ["🥇","🥈","🥉"]
         st.markdown("**🔥 Top Categories Explored**")
         for i,(cat,n) in enumerate(top3):
             st.markdown(f"{medals[i]} **{cat}** &nbsp;·&nbsp; {n} search{'es' if n>1 else ''}")
         st.markdown("---")
-        st.metric("Total Searches", len(st.session_state.cat_history))
+        st.metric("Total Searches", st.session_state.n_searches)
         st.metric("Unique Categories", len(counts))
         if st.button("🗑 Clear History", key="clear_hist"):
-            st.session_state.cat_history = []
+            st.session_state.cat_counts = Counter()
+            st.session_state.n_searches = 0
             st.session_state.last_tracked = None
             st.rerun()
     else:
         st.caption("Search for products to see your analytics here.")
 
-# ─── Hero ──────────────────────────────────────────────────────────────────────
-total  = len(df)
-cats_n = df['category'].nunique() if 'category' in df.columns else "—"
-brnd_n = df['brand'].nunique()    if 'brand'    in df.columns else "—"
+    # Images are cached per result set; Interactive is drawn by the browser
+    chart_style = st.radio("📈 Charts", charts.STYLES, horizontal=True)
+
+    # Process-wide switches: they affect every session on this server
+    with st.expander("⏱ Performance", expanded=False):
+        METRICS.enable(st.checkbox("Record timings", value=METRICS.enabled))
+        if st.checkbox("Profile slow requests", value=METRICS.profiler is not None):
+            slow_ms = st.number_input("Slower than (ms)", min_value=1, value=200, step=50)
+            METRICS.enable_profiler(slow_ms)
+        else:
+            METRICS.disable_profiler()
+        debug_slot = st.container()
+
+
+def render_debug_panel():
+    # Latest timings of this run (and everything before it), filled in last
+    METRICS.observe("app_run_seconds", time.perf_counter() - run_start)
+    if not METRICS.enabled:
+        return
+    with debug_slot:
+        snapshot = METRICS.snapshot()
+        st.dataframe(pd.DataFrame(
+            [(series, h["latest"] * 1000, h["mean"] * 1000, h["count"])
+             for series, h in snapshot["histograms"].items()],
+            columns=["timer", "latest ms", "mean ms", "n"]), hide_index=True)
+        st.caption("Engine: " + loader.stage + "".join(
+            f" · {stage} {seconds:.2f}s" for stage, seconds in loader.timings.items()))
+        if engine is not None:
+            cache = engine.result_cache.stats()
+            st.caption(f"Result cache: {cache['hits']:,} hits · {cache['misses']:,} misses · "
+                       f"{cache['evictions']:,} evictions · {cache['size']:,}/{cache['maxsize']:,}")
+        images = charts.images.stats()
+        st.caption(f"Chart images: {images['hits']:,} hits · {images['misses']:,} misses · "
+                   f"{images['size']:,}/{images['maxsize']:,}")
+        for profile in list(METRICS.profiler.profiles)[-3:] if METRICS.profiler else []:
+            st.caption(f"Slow: {profile['name']} {profile['seconds'] * 1000:.0f} ms")
+            st.code("\n".join(f"{n:>4}  " + " ← ".join(reversed(stack.split(";")[-3:]))
+                               for stack, n in profile["stacks"][:5]))
+        st.download_button("Prometheus", METRICS.to_prometheus(), "metrics.prom")
+        st.download_button("JSON", METRICS.to_json(), "metrics.json")
+
+# ─── Wait for the Engine ───────────────────────────────────────────────────────
+# Everything above is the shell: this is the first paint
+METRICS.observe("app_first_paint_seconds", time.perf_counter() - run_start)
+if not loader.ready.is_set():
+    status = st.empty()
+    while not loader.ready.is_set():
+        status.caption(f"⚙️ Similarity engine {loader.stage}… "
+                       f"{time.perf_counter() - run_start:.0f}s")
+        loader.ready.wait(0.5)
+    status.empty()
+if loader.error is not None:
+    st.error(f"Could not load the similarity engine: {loader.error!r}")
+    if st.button("↻ Retry"):
+        engine_loader.clear()
+        st.rerun()
+    render_debug_panel()
+    st.stop()
+engine = loader.engine
+df = engine.data
+# Shared by every session, computed once per catalog version
+facets = engine.facets
 
-try:
-    sample_imgs = df[df['image'].notna()].sample(min(8,len(df)))['image'].tolist()
-except:
-    sample_imgs = []
+# ─── Hero ──────────────────────────────────────────────────────────────────────
+total  = facets.n_products
+cats_n = facets.n_categories
+brnd_n = len(facets.brands)
+sample_imgs = facets.sample_images
 
 tile_pos = [("4%","10%","108px","−3deg","0.9"),("62%","5%","95px","6deg","0.8"),
             ("78%","20%","118px","−5deg","0.85"),("2%","54%","100px","8deg","0.75"),
@@ -253,48 +310,95 @@ h1{{font-family:'Syne',sans-serif;font-size:2.5rem;font-weight:800;line-height:1
     </div>
 </div>
 </body></html>"""
-components.html(hero, height=432, scrolling=False)
+with METRICS.timer("app_render_seconds", section="hero"):
+    components.html(hero, height=432, scrolling=False)
 
 # ─── Search Panel ──────────────────────────────────────────────────────────────
 
 
-raw_cats = df['category'].dropna().unique().tolist()
-cleaned_cats = sorted(set(clean_category(c) for c in raw_cats if clean_category(c) != "—"))
-cat_to_raw = {}
-for raw in raw_cats:
-    cat_to_raw.setdefault(clean_category(raw), []).append(raw)
 
 col_s, col_f = st.columns([3, 1])
 with col_s:
     q = st.text_input("🔍  Search for a product",
         placeholder="e.g. wireless earbuds, cotton kurti, laptop bag…")
 with col_f:
-    cf = st.selectbox("Filter by Category", ["All Categories"] + cleaned_cats)
+    cf = st.selectbox("Filter by Category", ["All Categories"] + facets.labels,
+                      format_func=lambda c: c if c == "All Categories" else f"{c} ({facets.label_counts[c]:,})")
 
 
 
-fdf = df[df["category"].isin(cat_to_raw.get(cf, []))] if cf != "All Categories" else df
-matches = fdf[fdf["product_name"].str.contains(q, case=False, na=False)] if q else fdf
+# Indexed search: only one page of matches ever reaches the browser
+PAGE_SIZE = 50
+search_cat = None if cf == "All Categories" else cf
+_, n_matches = engine.search_products(q, category=search_cat, limit=0)
 
-if len(matches) == 0:
+if n_matches == 0:
     st.markdown('<div class="nr">😕 No products found. Try a different search.</div>', unsafe_allow_html=True)
+    render_debug_panel()
     st.stop()
 
-choice = st.selectbox(f"Select a product ({len(matches):,} results)", matches["product_name"].tolist())
+n_pages = -(-n_matches // PAGE_SIZE)
+col_p, col_n = st.columns([5, 1])
+with col_n:
+    page = st.number_input("Page", min_value=1, max_value=n_pages, value=1) if n_pages > 1 else 1
+page_rows, _ = engine.search_products(q, category=search_cat, limit=PAGE_SIZE,
+                                      offset=(page - 1) * PAGE_SIZE)
+names = df["product_name"]
+with col_p:
+    idx = st.selectbox(f"Select a product ({n_matches:,} results · page {page} of {n_pages})",
+                       page_rows.tolist(), format_func=lambda i: names.iat[i])
+choice = names.iat[idx]
+
+# Narrow the recommendations; applied inside the engine's top-k selection
+with st.expander("🎚 Refine recommendations", expanded=False):
+    price_max = int(facets.price_max) + 1
+    fc1, fc2 = st.columns(2)
+    with fc1:
+        price_lo, price_hi = st.slider("Price (₹)", 0, price_max, (0, price_max))
+        rating_min = st.slider("Minimum rating", 0.0, 5.0, 0.0, step=0.5)
+        stock_only = st.checkbox("In stock only")
+    with fc2:
+        brand_names = facets.brands
+        brand_in = st.multiselect("Only these brands", brand_names)
+        brand_out = st.multiselect("Exclude brands", brand_names)
+    rc1, rc2 = st.columns(2)
+    with rc1:
+        rank_boost = st.checkbox("Favour well-rated, good-value products")
+        brand_cap = st.checkbox("At most 2 per brand")
+    with rc2:
+        variety = st.slider("Variety", 0.0, 0.8, 0.0, step=0.1,
+                            help="Trade some similarity for products less alike each other")
+rec_filter = Filter()
+if price_lo > 0 or price_hi < price_max:
+    rec_filter &= price_between(price_lo or None, price_hi if price_hi < price_max else None)
+if rating_min > 0:
+    rec_filter &= min_rating(rating_min)
+if stock_only:
+    rec_filter &= in_stock()
+if brand_in:
+    rec_filter &= brands(brand_in)
+if brand_out:
+    rec_filter &= exclude_brands(brand_out)
+# Re-ranks the best similarity candidates; None keeps the plain similarity order
+rec_rerank = None
+if rank_boost or brand_cap or variety:
+    rec_rerank = Reranker(None if rank_boost else {"similarity": 1.0}, diversity=variety,
+                          max_per_brand=2 if brand_cap else None)
+
 _, bcol, _ = st.columns([1, 2, 1])
 with bcol:
     clicked = st.button("✦ Find Similar Products")
 
 # ═══════════════════════════════════════════════════════════════════════════════
 if clicked:
-    idx     = df[df["product_name"] == choice].index[0]
     sel     = df.iloc[idx]
-    sel_cat = clean_category(sel.get("category",""))
+    sel_cat = clean_val(sel.get("category_label"))
 
     # ── Track ONLY if this is a NEW product (not a re-click on same one) ──────
     if choice != st.session_state.last_tracked:
         if sel_cat and sel_cat != "—":
-            st.session_state.cat_history.append((choice, sel_cat))
+            st.session_state.cat_counts[sel_cat] += 1
+            st.session_state.n_searches += 1
         st.session_state.last_tracked = choice
 
     # ── Selected Product ──────────────────────────────────────────────────────
@@ -306,7 +410,7 @@ if clicked:
     with c2:
         st.markdown(f'<div class="pnt">{sel["product_name"]}</div>', unsafe_allow_html=True)
         brand    = clean_val(sel.get("brand"))
-        category = clean_category(sel.get("category",""))
+        category = clean_val(sel.get("category_label"))
         rating   = clean_val(sel.get("overall_rating"))
         rat_disp = f"★ {rating}" if rating!="—" else '<span style="color:#605c6e;font-style:italic;">No rating</span>'
         pr_disp  = format_price(sel.get("discounted_price"), sel.get("retail_price"))
@@ -318,222 +422,168 @@ if clicked:
         </div>""", unsafe_allow_html=True)
 
     # ── Similar Products ──────────────────────────────────────────────────────
-    st.markdown('<div class="sh">✦ &nbsp; Top Similar Products — Same Category</div>', unsafe_allow_html=True)
-    results = engine.get_similar_products(idx)
-
-    if not results:
-        st.markdown('<div class="nr">No similar products found.</div>', unsafe_allow_html=True)
-    else:
-        ci = ""
-        for r in results:
-            sc = r['score']
-            col = "#2d7a4f" if sc>=0.7 else ("#b85c00" if sc>=0.4 else "#c0392b")
-            bg  = "#e8f5ee"  if sc>=0.7 else ("#fff3e0"  if sc>=0.4 else "#fdecea")
-
-            ps, pf = clean_price(r.get('price'))
-            rs, rf = clean_price(r.get('retail_price'))
-            if ps is None and rs is None:
-                pr = '<span style="color:#a09890;font-style:italic;font-size:0.72rem;">Price unavailable</span>'
-            elif ps is None:
-                pr = f'<span class="pp">{rs}</span>'
-            elif rs is None or (rf and rf<=pf):
-                pr = f'<span class="pp">{ps}</span>'
-            else:
-                d = round((1-pf/rf)*100) if rf else 0
-                pr = f'<span class="pp">{ps}</span>'
-                if d>0: pr += f'<span class="pr">{rs}</span><span class="pd">−{d}%</span>'
-
-            iu = clean_image(r.get("image"))
-            if iu:
-                ih = (f'<div class="iw"><img src="{iu}" class="im"'
-                      f' onerror="this.style.display=\'none\';this.nextElementSibling.style.display=\'flex\'"/>'
-                      f'<div class="ni" style="display:none">No Image</div>'
-                      f'<span class="badge" style="color:{col};background:{bg};">{sc:.0%}</span></div>')
-            else:
-                ih = (f'<div class="iw" style="background:#f0ece4;">'
-                      f'<div class="ni" style="display:flex">No Image</div>'
-                      f'<span class="badge" style="color:{col};background:{bg};">{sc:.0%}</span></div>')
-
-            br = clean_val(r.get("brand"))
-            rt = clean_val(r.get("rating"))
-            ct = clean_category(r.get("category",""))
-            de = clean_val(r.get("description",""), fallback="")
-            de = de[:100]+"…" if len(de)>100 else de
-            try:
-                sv=float(rt); fl=int(sv); em=5-fl
-                stars=(f'<span style="color:#e8a000">{"★"*fl}</span>'
-                       f'<span style="color:#ddd">{"☆"*em}</span>'
-                       f' <span style="color:#999;font-size:0.6rem">({rt})</span>')
-            except:
-                stars='<span style="color:#bbb;font-size:0.68rem;font-style:italic;">No rating</span>'
-
-            ci += (f'<div class="card">{ih}<div class="body">'
-                   f'<div class="cat">{ct}</div>'
-                   f'<div class="nm">{r["name"]}</div>'
-                   f'{"<div class=br>"+br+"</div>" if br!="—" else ""}'
-                   f'{"<div class=de>"+de+"</div>" if de else ""}'
-                   f'<div class="dv"></div>'
-                   f'<div class="st">{stars}</div>'
-                   f'<div class="pr-row">{pr}</div>'
-                   f'</div></div>')
-
-        cards_html = f"""<!DOCTYPE html><html><head>
-<link href="https://fonts.googleapis.com/css2?family=Playfair+Display:wght@600;700&family=DM+Sans:wght@300;400;500&display=swap" rel="stylesheet">
-<style>
-*{{box-sizing:border-box;margin:0;padding:0;}}
-body{{background:transparent;font-family:'DM Sans',sans-serif;}}
-.grid{{display:grid;grid-template-columns:repeat(5,1fr);gap:14px;padding:4px 2px 18px;}}
-.card{{background:#fff;border-radius:12px;overflow:hidden;display:flex;flex-direction:column;
-    box-shadow:0 1px 4px rgba(0,0,0,0.06);transition:transform 0.22s,box-shadow 0.22s;cursor:pointer;}}
-.card:hover{{transform:translateY(-5px);box-shadow:0 16px 40px rgba(0,0,0,0.13);}}
-.iw{{position:relative;width:100%;height:180px;background:#f5f2ed;overflow:hidden;flex-shrink:0;}}
-.im{{width:100%;height:100%;object-fit:contain;padding:12px;display:block;}}
-.ni{{width:100%;height:100%;align-items:center;justify-content:center;
-    background:#f0ece4;color:#a09890;font-size:0.62rem;letter-spacing:0.1em;text-transform:uppercase;}}
-.badge{{position:absolute;top:8px;left:8px;font-family:'DM Sans',sans-serif;
-    font-size:0.6rem;font-weight:700;padding:3px 9px;border-radius:99px;}}
-.body{{padding:13px;display:flex;flex-direction:column;gap:4px;flex:1;}}
-.cat{{font-size:0.55rem;font-weight:600;letter-spacing:0.14em;text-transform:uppercase;color:#b0a898;}}
-.nm{{font-family:'Playfair Display',serif;font-size:0.85rem;font-weight:600;color:#1a1814;
-    line-height:1.35;display:-webkit-box;-webkit-line-clamp:2;-webkit-box-orient:vertical;overflow:hidden;}}
-.br{{font-size:0.6rem;color:#999;text-transform:uppercase;letter-spacing:0.08em;}}
-.de{{font-size:0.67rem;color:#7a7570;line-height:1.5;display:-webkit-box;
-    -webkit-line-clamp:2;-webkit-box-orient:vertical;overflow:hidden;margin-top:2px;}}
-.dv{{width:28px;height:1.5px;background:#e0d8ce;margin:6px 0;}}
-.st{{font-size:0.72rem;margin-bottom:2px;}}
-.pr-row{{display:flex;align-items:baseline;gap:5px;flex-wrap:wrap;}}
-.pp{{font-family:'Playfair Display',serif;font-size:1rem;font-weight:700;color:#c0392b;}}
-.pr{{font-size:0.67rem;color:#bbb;text-decoration:line-through;}}
-.pd{{font-size:0.6rem;font-weight:700;color:#2d7a4f;background:#e8f5ee;padding:1px 6px;border-radius:99px;}}
-</style></head><body>
-<div class="grid">{ci}</div>
-</body></html>"""
-        components.html(cards_html, height=520, scrolling=False)
+    scope = " · ".join(["Same Category"] + (["Filtered"] if rec_filter else [])
+                       + (["Re-ranked"] if rec_rerank else []))
+    st.markdown(f'<div class="sh">✦ &nbsp; Top Similar Products — {scope}</div>', unsafe_allow_html=True)
+    results = engine.get_similar_products(idx, filters=rec_filter, rerank=rec_rerank)
+
+    with METRICS.timer("app_render_seconds", section="cards"):
+        if not results:
+            st.markdown('<div class="nr">No similar products found.</div>', unsafe_allow_html=True)
+        else:
+            ci = ""
+            for r in results:
+                sc = r['score']
+                col = "#2d7a4f" if sc>=0.7 else ("#b85c00" if sc>=0.4 else "#c0392b")
+                bg  = "#e8f5ee"  if sc>=0.7 else ("#fff3e0"  if sc>=0.4 else "#fdecea")
+
+                ps, pf = clean_price(r.get('price'))
+                rs, rf = clean_price(r.get('retail_price'))
+                if ps is None and rs is None:
+                    pr = '<span style="color:#a09890;font-style:italic;font-size:0.72rem;">Price unavailable</span>'
+                elif ps is None:
+                    pr = f'<span class="pp">{rs}</span>'
+                elif rs is None or (rf and rf<=pf):
+                    pr = f'<span class="pp">{ps}</span>'
+                else:
+                    d = round((1-pf/rf)*100) if rf else 0
+                    pr = f'<span class="pp">{ps}</span>'
+                    if d>0: pr += f'<span class="pr">{rs}</span><span class="pd">−{d}%</span>'
+
+                iu = clean_image(r.get("image"))
+                if iu:
+                    ih = (f'<div class="iw"><img src="{iu}" class="im"'
+                          f' onerror="this.style.display=\'none\';this.nextElementSibling.style.display=\'flex\'"/>'
+                          f'<div class="ni" style="display:none">No Image</div>'
+                          f'<span class="badge" style="color:{col};background:{bg};">{sc:.0%}</span></div>')
+                else:
+                    ih = (f'<div class="iw" style="background:#f0ece4;">'
+                          f'<div class="ni" style="display:flex">No Image</div>'
+                          f'<span class="badge" style="color:{col};background:{bg};">{sc:.0%}</span></div>')
+
+                br = clean_val(r.get("brand"))
+                rt = clean_val(r.get("rating"))
+                ct = clean_val(r.get("category_label"))
+                de = clean_val(r.get("description",""), fallback="")
+                de = de[:100]+"…" if len(de)>100 else de
+                try:
+                    sv=float(rt); fl=int(sv); em=5-fl
+                    stars=(f'<span style="color:#e8a000">{"★"*fl}</span>'
+                           f'<span style="color:#ddd">{"☆"*em}</span>'
+                           f' <span style="color:#999;font-size:0.6rem">({rt})</span>')
+                except:
+                    stars='<span style="color:#bbb;font-size:0.68rem;font-style:italic;">No rating</span>'
+
+                ci += (f'<div class="card">{ih}<div class="body">'
+                       f'<div class="cat">{ct}</div>'
+                       f'<div class="nm">{r["name"]}</div>'
+                       f'{"<div class=br>"+br+"</div>" if br!="—" else ""}'
+                       f'{"<div class=de>"+de+"</div>" if de else ""}'
+                       f'<div class="dv"></div>'
+                       f'<div class="st">{stars}</div>'
+                       f'<div class="pr-row">{pr}</div>'
+                       f'</div></div>')
+
+            cards_html = f"""<!DOCTYPE html><html><head>
+    <link href="https://fonts.googleapis.com/css2?family=Playfair+Display:wght@600;700&family=DM+Sans:wght@300;400;500&display=swap" rel="stylesheet">
+    <style>
+    *{{box-sizing:border-box;margin:0;padding:0;}}
+    body{{background:transparent;font-family:'DM Sans',sans-serif;}}
+    .grid{{display:grid;grid-template-columns:repeat(5,1fr);gap:14px;padding:4px 2px 18px;}}
+    .card{{background:#fff;border-radius:12px;overflow:hidden;display:flex;flex-direction:column;
+        box-shadow:0 1px 4px rgba(0,0,0,0.06);transition:transform 0.22s,box-shadow 0.22s;cursor:pointer;}}
+    .card:hover{{transform:translateY(-5px);box-shadow:0 16px 40px rgba(0,0,0,0.13);}}
+    .iw{{position:relative;width:100%;height:180px;background:#f5f2ed;overflow:hidden;flex-shrink:0;}}
+    .im{{width:100%;height:100%;object-fit:contain;padding:12px;display:block;}}
+    .ni{{width:100%;height:100%;align-items:center;justify-content:center;
+        background:#f0ece4;color:#a09890;font-size:0.62rem;letter-spacing:0.1em;text-transform:uppercase;}}
+    .badge{{position:absolute;top:8px;left:8px;font-family:'DM Sans',sans-serif;
+        font-size:0.6rem;font-weight:700;padding:3px 9px;border-radius:99px;}}
+    .body{{padding:13px;display:flex;flex-direction:column;gap:4px;flex:1;}}
+    .cat{{font-size:0.55rem;font-weight:600;letter-spacing:0.14em;text-transform:uppercase;color:#b0a898;}}
+    .nm{{font-family:'Playfair Display',serif;font-size:0.85rem;font-weight:600;color:#1a1814;
+        line-height:1.35;display:-webkit-box;-webkit-line-clamp:2;-webkit-box-orient:vertical;overflow:hidden;}}
+    .br{{font-size:0.6rem;color:#999;text-transform:uppercase;letter-spacing:0.08em;}}
+    .de{{font-size:0.67rem;color:#7a7570;line-height:1.5;display:-webkit-box;
+        -webkit-line-clamp:2;-webkit-box-orient:vertical;overflow:hidden;margin-top:2px;}}
+    .dv{{width:28px;height:1.5px;background:#e0d8ce;margin:6px 0;}}
+    .st{{font-size:0.72rem;margin-bottom:2px;}}
+    .pr-row{{display:flex;align-items:baseline;gap:5px;flex-wrap:wrap;}}
+    .pp{{font-family:'Playfair Display',serif;font-size:1rem;font-weight:700;color:#c0392b;}}
+    .pr{{font-size:0.67rem;color:#bbb;text-decoration:line-through;}}
+    .pd{{font-size:0.6rem;font-weight:700;color:#2d7a4f;background:#e8f5ee;padding:1px 6px;border-radius:99px;}}
+    </style></head><body>
+    <div class="grid">{ci}</div>
+    </body></html>"""
+            components.html(cards_html, height=520, scrolling=False)
 
     # ════════════════════════════════════════════════════════════════════════════
-    # ▶  FEATURE 1 — Cosine Similarity Bar Chart
+    # ▶  Charts — slots are laid out first and filled once the cards are on
+    #    screen; images come from the process-wide cache when this result set
+    #    was drawn before
     # ════════════════════════════════════════════════════════════════════════════
-    st.markdown('<div class="sh">📊 &nbsp; Cosine Similarity Scores</div>', unsafe_allow_html=True)
-
-    try:
-        names_s = [r['name'][:40]+"…" if len(r['name'])>40 else r['name'] for r in results]
-        scores  = [r['score'] for r in results]
-        bcolors = ["#4caf7d" if s>=0.7 else ("#ff8c00" if s>=0.4 else "#ff3c64") for s in scores]
-
-        fig, ax = plt.subplots(figsize=(10, 3.2))
-        fig.patch.set_facecolor('#0f0d18')
-        ax.set_facecolor('#0f0d18')
-
-        ax.barh(names_s, [1]*len(names_s), color='#1a1728', height=0.55, zorder=1)
-        bars = ax.barh(names_s, scores, color=bcolors, height=0.55, zorder=2, alpha=0.92)
-
-        for bar, score in zip(bars, scores):
-            ax.text(score + 0.02, bar.get_y() + bar.get_height()/2,
-                    f'{score:.3f}', va='center', ha='left',
-                    color='#e8e4dc', fontsize=9.5, fontfamily='monospace', fontweight='bold')
-
-        ax.set_xlim(0, 1.18)
-        ax.set_xlabel('Similarity Score', color='#45424f', fontsize=9)
-        for spine in ax.spines.values():
-            spine.set_edgecolor('#1a1728')
-        ax.xaxis.grid(True, color='#1a1728', linewidth=0.8)
-        ax.set_axisbelow(True)
-        ax.tick_params(colors='#9994a8', labelsize=9)
-        plt.xticks(color='#45424f')
-        plt.tight_layout(pad=1.2)
-        st.pyplot(fig, use_container_width=True)
-        plt.close(fig)
-    except Exception as e:
-        st.caption(f"Chart error: {e}")
-
-    # ════════════════════════════════════════════════════════════════════════════
-    # ▶  FEATURE 3 — Similarity Heatmap
-    # ════════════════════════════════════════════════════════════════════════════
-    st.markdown('<div class="sh">🔥 &nbsp; Similarity Heatmap — Selected vs Top Matches</div>', unsafe_allow_html=True)
-
-    try:
-        r_indices = []
-        for r in results:
-            m = df[df["product_name"] == r['name']]
-            if len(m): r_indices.append(m.index[0])
-
-        all_idx  = [idx] + r_indices
-        all_lbl  = ["★ Selected"] + [
-            (r['name'][:20]+"…" if len(r['name'])>20 else r['name'])
-            for r in results[:len(r_indices)]
-        ]
-        sub = engine.similarity_matrix[np.ix_(all_idx, all_idx)]
-
-        cmap = mcolors.LinearSegmentedColormap.from_list("flame", [
-            (0.00,"#0d0b12"),(0.30,"#1a0e18"),(0.55,"#5c1a00"),
-            (0.75,"#c04800"),(0.88,"#ff8c00"),(1.00,"#ffe066")
-        ])
-
-        fig2, ax2 = plt.subplots(figsize=(8, 5.5))
-        fig2.patch.set_facecolor('#0f0d18')
-        ax2.set_facecolor('#0f0d18')
-
-        im = ax2.imshow(sub, cmap=cmap, vmin=0, vmax=1, aspect='auto')
-        for i in range(len(all_lbl)):
-            for j in range(len(all_lbl)):
-                v = sub[i,j]
-                ax2.text(j, i, f'{v:.2f}', ha='center', va='center', fontsize=8,
-                         color='#000' if v>0.7 else '#e8e4dc', fontweight='bold')
-
-        ax2.set_xticks(range(len(all_lbl)))
-        ax2.set_yticks(range(len(all_lbl)))
-        ax2.set_xticklabels(all_lbl, rotation=35, ha='right', color='#9994a8', fontsize=8)
-        ax2.set_yticklabels(all_lbl, color='#9994a8', fontsize=8)
-        for spine in ax2.spines.values():
-            spine.set_edgecolor('#1a1728')
-
-        cb = fig2.colorbar(im, ax=ax2, fraction=0.03, pad=0.03)
-        cb.ax.tick_params(colors='#9994a8', labelsize=8)
-        cb.outline.set_edgecolor('#1a1728')
-
-        plt.tight_layout(pad=1.5)
-        st.pyplot(fig2, use_container_width=True)
-        plt.close(fig2)
-    except Exception as e:
-        st.caption(f"Heatmap error: {e}")
+    def show_chart(slot, key, render_png, spec):
+        with slot.container():
+            if chart_style == "Interactive":
+                st.vega_lite_chart(spec, use_container_width=True)
+            else:
+                st.image(charts.cached_png(key, engine.catalog_version, render_png),
+                         use_container_width=True)
+
+    if chart_style != "Off" and results:
+        st.markdown('<div class="sh">📊 &nbsp; Cosine Similarity Scores</div>', unsafe_allow_html=True)
+        bar_slot = st.empty()
+        bar_slot.caption("Rendering chart…")
+        st.markdown('<div class="sh">🔥 &nbsp; Similarity Heatmap — Selected vs Top Matches</div>', unsafe_allow_html=True)
+        heat_slot = st.empty()
+        heat_slot.caption("Rendering heatmap…")
+        # One key per result set: same product, filters and catalog version
+        result_key = (idx, tuple((r['row'], r['score']) for r in results))
+
+        with METRICS.timer("app_render_seconds", section="bar_chart"):
+            try:
+                names_s = [r['name'][:40]+"…" if len(r['name'])>40 else r['name'] for r in results]
+                scores  = [r['score'] for r in results]
+                show_chart(bar_slot, ("bars",) + result_key,
+                           lambda: charts.similarity_bars_png(names_s, scores),
+                           charts.similarity_bars_spec(names_s, scores))
+            except Exception as e:
+                bar_slot.caption(f"Chart error: {e}")
+
+        with METRICS.timer("app_render_seconds", section="heatmap"):
+            try:
+                all_idx = [idx] + [r['row'] for r in results]
+                all_lbl = ["★ Selected"] + [
+                    (r['name'][:20]+"…" if len(r['name'])>20 else r['name'])
+                    for r in results
+                ]
+                sub = engine.similarity_submatrix(all_idx)
+                show_chart(heat_slot, ("heatmap",) + result_key,
+                           lambda: charts.heatmap_png(all_lbl, sub),
+                           charts.heatmap_spec(all_lbl, sub))
+            except Exception as e:
+                heat_slot.caption(f"Heatmap error: {e}")
 
     # ════════════════════════════════════════════════════════════════════════════
     # ▶  FEATURE 3 — Session Analytics: Top Categories
     # ════════════════════════════════════════════════════════════════════════════
-    if len(st.session_state.cat_history) >= 1:
-        st.markdown('<div class="sh">📈 &nbsp; Your Session — Top Explored Categories</div>', unsafe_allow_html=True)
-
-        cat_names_only = [c for _, c in st.session_state.cat_history]
-        counts  = Counter(cat_names_only)
-        top5    = counts.most_common(5)
-        t_names = [c for c,_ in top5]
-        t_vals  = [n for _,n in top5]
-        pal     = ["#ff8c00","#ff3c64","#a259ff","#00c9a7","#ffd600"]
-
-        fig3, ax3 = plt.subplots(figsize=(9, 2.8))
-        fig3.patch.set_facecolor('#0f0d18')
-        ax3.set_facecolor('#0f0d18')
-
-        max_v = max(t_vals) if t_vals else 1
-        ax3.barh(t_names, [max_v]*len(t_names), color='#1a1728', height=0.5, zorder=1)
-        ax3.barh(t_names, t_vals, color=pal[:len(t_names)], height=0.5, zorder=2, alpha=0.9)
-
-        for name, val in zip(t_names, t_vals):
-            ax3.text(val + max_v*0.02, t_names.index(name), f' {val} search{"es" if val>1 else ""}',
-                     va='center', color='#e8e4dc', fontsize=9.5, fontweight='bold')
-
-        ax3.set_xlim(0, max_v * 1.5)
-        ax3.set_xlabel('Searches', color='#45424f', fontsize=9)
-        for spine in ax3.spines.values():
-            spine.set_edgecolor('#1a1728')
-        ax3.xaxis.grid(True, color='#1a1728', linewidth=0.8)
-        ax3.set_axisbelow(True)
-        ax3.tick_params(colors='#9994a8', labelsize=9)
-        plt.tight_layout(pad=1.2)
-        st.pyplot(fig3, use_container_width=True)
-        plt.close(fig3)
-
-        m1, m2, m3 = st.columns(3)
-        with m1: st.metric("🔎 Total Searches", len(st.session_state.cat_history))
-        with m2: st.metric("📁 Unique Categories", len(counts))
-        with m3: st.metric("🏆 Favourite", top5[0][0] if top5 else "—")
\ No newline at end of file
+    with METRICS.timer("app_render_seconds", section="session_chart"):
+        if st.session_state.n_searches >= 1:
+            st.markdown('<div class="sh">📈 &nbsp; Your Session — Top Explored Categories</div>', unsafe_allow_html=True)
+
+            counts  = st.session_state.cat_counts
+            top5    = counts.most_common(5)
+            t_names = [c for c,_ in top5]
+            t_vals  = [n for _,n in top5]
+
+            if chart_style != "Off":
+                show_chart(st.empty(), ("session", tuple(top5)),
+                           lambda: charts.session_bars_png(t_names, t_vals),
+                           charts.session_bars_spec(t_names, t_vals))
+
+            m1, m2, m3 = st.columns(3)
+            with m1: st.metric("🔎 Total Searches", st.session_state.n_searches)
+            with m2: st.metric("📁 Unique Categories", len(counts))
+            with m3: st.metric("🏆 Favourite", top5[0][0] if top5 else "—")
+
+render_debug_panel()
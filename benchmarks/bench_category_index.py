@@ -0,0 +1,82 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from similarity_engine import SimilarityEngine
+
+# Candidate selection in get_similar_products: the old DataFrame scan + full
+# sort against the precomputed category index + argpartition. Only the
+# selection step is timed, so the synthetic catalog needs no descriptions
+# and the similarity row is random (a 1M x 1M matrix would not fit anyway).
+
+
+def synthetic_catalog(n_rows, n_categories, seed=0):
+    rng = np.random.default_rng(seed)
+    # Zipf-like skew: a few huge categories ("Clothing") and a long tail
+    weights = 1.0 / np.arange(1, n_categories + 1)
+    weights /= weights.sum()
+    cats = rng.choice(n_categories, size=n_rows, p=weights)
+    return pd.DataFrame({"category": [f"Category {c}" for c in cats]})
+
+
+def legacy_rank(data, row_scores, index, top_n):
+    category = data.iloc[index]["category"]
+    same_cat_indices = data[data["category"] == category].index.tolist()
+    scores = []
+    for idx in same_cat_indices:
+        scores.append((idx, row_scores[idx]))
+    scores = sorted(scores, key=lambda x: x[1], reverse=True)
+    scores = [s for s in scores if s[0] != index]
+    return scores[:top_n]
+
+
+def time_queries(fn, queries):
+    latencies = []
+    for q in queries:
+        start = time.perf_counter()
+        fn(q)
+        latencies.append(time.perf_counter() - start)
+    return np.array(latencies) * 1000
+
+
+def report(label, ms):
+    print(f"{label:<10} n={len(ms):<6} p50={np.percentile(ms, 50):9.3f} ms  "
+          f"p99={np.percentile(ms, 99):9.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--categories", type=int, default=60)
+    parser.add_argument("--top-n", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--legacy-queries", type=int, default=30)
+    args = parser.parse_args()
+
+    data = synthetic_catalog(args.rows, args.categories)
+    row_scores = np.random.default_rng(1).random(args.rows).astype(np.float32)
+
+    engine = SimilarityEngine.__new__(SimilarityEngine)
+    engine.data = data
+    start = time.perf_counter()
+    engine._build_category_index()
+    print(f"category index built in {time.perf_counter() - start:.2f}s "
+          f"for {args.rows:,} rows / {len(engine.category_rows)} categories")
+
+    rng = np.random.default_rng(2)
+    legacy = time_queries(lambda i: legacy_rank(data, row_scores, i, args.top_n),
+                          rng.integers(0, args.rows, args.legacy_queries))
+    indexed = time_queries(lambda i: engine._rank_in_category(i, row_scores, args.top_n),
+                           rng.integers(0, args.rows, args.queries))
+    report("legacy", legacy)
+    report("indexed", indexed)
+    print(f"p50 speedup x{np.percentile(legacy, 50) / np.percentile(indexed, 50):.0f}")
+
+
+if __name__ == "__main__":
+    main()
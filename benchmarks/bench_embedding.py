@@ -0,0 +1,82 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from catalog import default_catalog_path
+from embedding import LSAEmbedding
+from similarity_engine import SimilarityEngine
+
+# Dense LSA embedding mode against the exact sparse TF-IDF path: build time,
+# scoring memory, single-query and batch latency, and overlap@k with the
+# exact same-category ranking.
+
+
+def sparse_neighbors(engine, index, k):
+    # Exact ranking straight from the sparse TF-IDF rows
+    row_scores = (engine.tfidf_matrix @ engine.tfidf_matrix[index].T).toarray().ravel()
+    return engine._rank_in_category(index, row_scores, k)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--catalog", default=default_catalog_path())
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--n-components", type=int, nargs="+", default=[64, 128, 256])
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    sparse = SimilarityEngine(args.catalog, mode="embedding",
+                              embedding=LSAEmbedding(n_components=args.n_components[0]))
+    print(f"loaded {len(sparse.data):,} rows in {time.perf_counter() - start:.1f}s")
+    X = sparse.tfidf_matrix
+    sparse_mb = (X.data.nbytes + X.indices.nbytes + X.indptr.nbytes) / 1e6
+
+    rng = np.random.default_rng(0)
+    queries = rng.choice(len(sparse.data), size=min(args.queries, len(sparse.data)), replace=False)
+    queries = queries[sparse.category_codes[queries] >= 0]
+
+    latencies = []
+    exact = {}
+    for q in queries:
+        t = time.perf_counter()
+        exact[q] = [i for i, _ in sparse_neighbors(sparse, q, args.k)]
+        latencies.append((time.perf_counter() - t) * 1000)
+
+    print(f"\n{'path':<14} {'build s':>8} {'MB':>8} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'batch us/q':>11} {'overlap@' + str(args.k):>11}")
+    print(f"{'sparse tfidf':<14} {'-':>8} {sparse_mb:>8.1f} {np.percentile(latencies, 50):>8.3f} "
+          f"{np.percentile(latencies, 99):>8.3f} {'-':>11} {1:>11.4f}")
+
+    for n_components in args.n_components:
+        start = time.perf_counter()
+        sparse.embedding = LSAEmbedding(n_components=n_components).build(X, sparse.category_rows)
+        built = time.perf_counter() - start
+
+        latencies = []
+        hits = total = 0
+        for q in queries:
+            t = time.perf_counter()
+            found = [i for i, _ in sparse._rank_embedding(q, args.k)]
+            latencies.append((time.perf_counter() - t) * 1000)
+            hits += len(set(found) & set(exact[q]))
+            total += len(exact[q])
+
+        t = time.perf_counter()
+        for start in range(0, len(queries), args.batch_size):
+            sparse._ranked_neighbors_batch(queries[start:start + args.batch_size], args.k)
+        batch_us = (time.perf_counter() - t) * 1e6 / max(len(queries), 1)
+
+        mb = sum(arr.nbytes for arr in sparse.embedding.arrays().values()) / 1e6
+        print(f"{'lsa-' + str(n_components):<14} {built:>8.1f} {mb:>8.1f} "
+              f"{np.percentile(latencies, 50):>8.3f} {np.percentile(latencies, 99):>8.3f} "
+              f"{batch_us:>11.1f} {hits / max(total, 1):>11.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ann_index import IVFIndex
+from catalog import default_catalog_path
+from similarity_engine import SimilarityEngine
+
+# recall@k of the IVF backend against exact same-category cosine ranking,
+# with per-query latency, for a sweep of nprobe values.
+
+
+def exact_neighbors(engine, index, k):
+    row_scores = (engine.tfidf_matrix @ engine.tfidf_matrix[index].T).toarray().ravel()
+    return [i for i, _ in engine._rank_in_category(index, row_scores, k)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--catalog", default=default_catalog_path())
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--n-components", type=int, default=128)
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    engine = SimilarityEngine(args.catalog, mode="ann",
+                              ann_index=IVFIndex(n_components=args.n_components, nlist=args.nlist))
+    print(f"built ann engine over {len(engine.data):,} rows in {time.perf_counter() - start:.1f}s")
+
+    rng = np.random.default_rng(0)
+    queries = rng.choice(len(engine.data), size=min(args.queries, len(engine.data)), replace=False)
+    queries = [q for q in queries if engine.category_codes[q] >= 0]
+    exact = {q: exact_neighbors(engine, q, args.k) for q in queries}
+
+    print(f"{'nprobe':>6}  {'recall@' + str(args.k):>9}  {'p50 ms':>8}  {'p99 ms':>8}")
+    for nprobe in args.nprobe:
+        hits = total = 0
+        latencies = []
+        for q in queries:
+            t = time.perf_counter()
+            found = [i for i, _ in engine._rank_ann(q, args.k, nprobe)]
+            latencies.append((time.perf_counter() - t) * 1000)
+            hits += len(set(found) & set(exact[q]))
+            total += len(exact[q])
+        print(f"{nprobe:>6}  {hits / max(total, 1):>9.3f}  "
+              f"{np.percentile(latencies, 50):>8.3f}  {np.percentile(latencies, 99):>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
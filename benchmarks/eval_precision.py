@@ -0,0 +1,66 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from catalog import default_catalog_path
+from quantize import STORAGE_DTYPES
+from similarity_engine import SimilarityEngine
+
+# Top-k agreement of each storage dtype against float64, and the memory it
+# saves on the TF-IDF matrix plus the similarity/neighbour score storage.
+
+
+def storage_bytes(engine):
+    X = engine.tfidf_matrix
+    total = X.data.nbytes + X.indices.nbytes + X.indptr.nbytes
+    for name in ("similarity_matrix", "similarity_scales", "neighbor_scores", "neighbor_scales"):
+        arr = getattr(engine, name, None)
+        if arr is not None:
+            total += arr.nbytes
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--catalog", default=default_catalog_path())
+    parser.add_argument("--mode", choices=["dense", "topk"], default="topk")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--min-overlap", type=float, default=0.95,
+                        help="exit non-zero if any dtype's mean overlap@k falls below this")
+    args = parser.parse_args()
+
+    engines = {}
+    for dtype in STORAGE_DTYPES:
+        start = time.perf_counter()
+        engines[dtype] = SimilarityEngine(args.catalog, mode=args.mode, k=args.k, dtype=dtype)
+        print(f"built {dtype:<8} in {time.perf_counter() - start:.1f}s")
+
+    reference = engines["float64"]
+    rng = np.random.default_rng(0)
+    queries = rng.choice(len(reference.data), size=min(args.queries, len(reference.data)), replace=False)
+    expected = reference._ranked_neighbors_batch(queries, args.k)[0]
+    # Products without a category have no neighbours to compare
+    queries, expected = queries[expected[:, 0] >= 0], expected[expected[:, 0] >= 0]
+    ref_bytes = storage_bytes(reference)
+
+    failed = False
+    print(f"\n{'dtype':<8} {'MB':>9} {'saved':>7} {'overlap@' + str(args.k):>11} {'same order':>11}")
+    for dtype, engine in engines.items():
+        got = engine._ranked_neighbors_batch(queries, args.k)[0]
+        overlap = [len(set(g[g >= 0]) & set(e[e >= 0])) / max((e >= 0).sum(), 1)
+                   for g, e in zip(got, expected)]
+        same = (got == expected).all(axis=1).mean()
+        size = storage_bytes(engine)
+        print(f"{dtype:<8} {size / 1e6:>9.1f} {1 - size / ref_bytes:>7.0%} "
+              f"{np.mean(overlap):>11.4f} {same:>11.2%}")
+        failed |= np.mean(overlap) < args.min_overlap
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from urllib.parse import quote, urlsplit
+
+import numpy as np
+import pyarrow.feather as feather
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Closed-loop load generator for server.py: --concurrency keep-alive
+# clients request random products for --duration seconds, then report
+# throughput and tail latency.
+
+
+async def request(reader, writer, method, target, body=b""):
+    writer.write((f"{method} {target} HTTP/1.1\r\nHost: localhost\r\n"
+                  f"Content-Length: {len(body)}\r\n\r\n").encode() + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        header = await reader.readline()
+        if header in (b"\r\n", b""):
+            break
+        name, _, value = header.decode("latin-1").partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    return status, await reader.readexactly(length)
+
+
+async def wait_ready(host, port, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+            status, _ = await request(reader, writer, "GET", "/readyz")
+            writer.close()
+            if status == 200:
+                return
+        except OSError:
+            pass
+        await asyncio.sleep(0.5)
+    raise SystemExit(f"server at {host}:{port} not ready after {timeout}s")
+
+
+async def client(host, port, ids, args, deadline, latencies, errors, seed):
+    rng = np.random.default_rng(seed)
+    reader, writer = await asyncio.open_connection(host, port)
+    while time.monotonic() < deadline:
+        if args.batch_size:
+            body = json.dumps({"ids": rng.choice(ids, args.batch_size).tolist(),
+                               "top_n": args.top_n}).encode()
+            method, target = "POST", "/similar/batch"
+        else:
+            body = b""
+            method, target = "GET", f"/similar?id={quote(str(rng.choice(ids)))}&top_n={args.top_n}"
+        start = time.perf_counter()
+        status, _ = await request(reader, writer, method, target, body)
+        latencies.append(time.perf_counter() - start)
+        errors.append(status != 200)
+    writer.close()
+
+
+async def run(args):
+    url = urlsplit(args.url)
+    host, port = url.hostname, url.port or 80
+    with open(os.path.join(args.artifacts, "manifest.json"), encoding="utf-8") as f:
+        version = json.load(f)["version"]
+    ids = feather.read_table(os.path.join(args.artifacts, version, "catalog.arrow"),
+                             columns=["product_id"])["product_id"].to_numpy()
+    await wait_ready(host, port, args.ready_timeout)
+
+    latencies, errors = [], []
+    deadline = time.monotonic() + args.duration
+    start = time.perf_counter()
+    await asyncio.gather(*(client(host, port, ids, args, deadline, latencies, errors, seed)
+                           for seed in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+
+    ms = np.array(latencies) * 1000
+    per_request = args.batch_size or 1
+    print(f"requests    {len(ms):>10,}  ({sum(errors)} errors)")
+    print(f"throughput  {len(ms) / elapsed:>10,.0f} req/s  "
+          f"({len(ms) * per_request / elapsed:,.0f} products/s)")
+    for p in (50, 95, 99):
+        print(f"p{p:<10} {np.percentile(ms, p):>10.2f} ms")
+    print(f"max         {ms.max():>10.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--artifacts", default="data/engine", help="for the product ids to request")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--top-n", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=0,
+                        help="ids per POST /similar/batch; 0 uses GET /similar")
+    parser.add_argument("--ready-timeout", type=float, default=120.0)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
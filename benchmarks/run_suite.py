@@ -0,0 +1,182 @@
+import argparse
+import json
+import multiprocessing as mp
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic_catalog import parse_size, raw_feed
+
+# End-to-end performance suite on synthetic catalogs (synthetic_catalog.py):
+# clean_data.py stages, engine build stages, artifact save/load, peak RSS,
+# get_similar_products latency and batch throughput. Every size runs in a
+# fresh process so peak RSS is per size. Results go to a JSON file; pass
+# --compare with an older one to see what moved.
+#
+#   python benchmarks/run_suite.py --sizes 10k 100k 1M --compare old.json
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux; pool workers count under RUSAGE_CHILDREN
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return {"self": round(own, 1), "children": round(children, 1)}
+
+
+def percentiles(seconds):
+    ms = np.asarray(seconds) * 1000
+    return {"p50": float(np.percentile(ms, 50)), "p95": float(np.percentile(ms, 95)),
+            "p99": float(np.percentile(ms, 99)), "mean": float(ms.mean())}
+
+
+def run_size(n_rows, args):
+    # Runs in a spawned process: imports and memory start from scratch
+    import clean_data
+    from similarity_engine import SimilarityEngine
+
+    result = {"rows": n_rows, "peak_rss_mb": {}}
+    feed = raw_feed(n_rows, args.data_dir, args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        parquet = os.path.join(tmp, "catalog.parquet")
+        counts, timings = clean_data.run(feed, os.path.join(tmp, "clean.csv"), parquet,
+                                         args.chunksize, args.workers)
+        result["catalog"] = dict(counts)
+        result["clean_s"] = dict(timings)
+        result["peak_rss_mb"]["clean"] = peak_rss_mb()
+
+        start = time.perf_counter()
+        engine = SimilarityEngine(parquet, mode=args.mode, k=args.k, dtype=args.dtype,
+                                  n_jobs=args.n_jobs, cache_size=0)
+        result["build_s"] = dict(engine.build_timings, total=time.perf_counter() - start)
+        result["peak_rss_mb"]["build"] = peak_rss_mb()
+
+        start = time.perf_counter()
+        engine.save(os.path.join(tmp, "engine"))
+        result["build_s"]["save"] = time.perf_counter() - start
+        start = time.perf_counter()
+        SimilarityEngine.load(os.path.join(tmp, "engine"))
+        result["build_s"]["load (mmap)"] = time.perf_counter() - start
+
+    rng = np.random.default_rng(args.seed)
+    n = len(engine.data)
+    queries = rng.choice(n, size=min(args.queries, n), replace=False)
+    latencies = []
+    for q in queries:
+        start = time.perf_counter()
+        engine.get_similar_products(q, args.top_n)
+        latencies.append(time.perf_counter() - start)
+    result["latency_ms"] = percentiles(latencies)
+
+    rows = rng.choice(n, size=min(args.batch_rows, n), replace=False).astype(np.int32)
+    start = time.perf_counter()
+    for i in range(0, len(rows), args.batch_size):
+        engine.get_similar_products_batch(rows[i:i + args.batch_size], args.top_n)
+    elapsed = time.perf_counter() - start
+    result["batch"] = {"rows": len(rows), "batch_size": args.batch_size,
+                       "products_per_s": len(rows) / elapsed}
+    result["peak_rss_mb"]["query"] = peak_rss_mb()
+    return result
+
+
+def metadata(args):
+    import numpy, pandas, scipy, sklearn
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "versions": {m.__name__: m.__version__ for m in (numpy, pandas, scipy, sklearn)},
+        "args": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+    }
+
+
+def flatten(record, prefix=""):
+    out = {}
+    for key, value in record.items():
+        if isinstance(value, dict):
+            out.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)):
+            out[prefix + key] = value
+    return out
+
+
+def compare(old_path, runs):
+    with open(old_path, encoding="utf-8") as f:
+        old = {run["rows"]: flatten(run) for run in json.load(f)["runs"]}
+    for run in runs:
+        before = old.get(run["rows"])
+        if before is None:
+            continue
+        print(f"\n{run['rows']:,} rows vs {old_path}")
+        for key, value in flatten(run).items():
+            if key in before and before[key]:
+                print(f"  {key:<40} {before[key]:>12.3f} -> {value:>12.3f}  "
+                      f"{value / before[key] - 1:>+8.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Engine and pipeline benchmark suite")
+    parser.add_argument("--sizes", type=parse_size, nargs="+",
+                        default=[parse_size(s) for s in ("10k", "100k", "1M")])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default=os.path.join(ROOT, "benchmarks", "data"))
+    parser.add_argument("--mode", default="topk")
+    parser.add_argument("--dtype", default="float32")
+    parser.add_argument("--k", type=int, default=50)
+    parser.add_argument("--n-jobs", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="clean_data.py workers")
+    parser.add_argument("--chunksize", type=int, default=100_000)
+    parser.add_argument("--top-n", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--batch-rows", type=int, default=50_000)
+    parser.add_argument("--batch-size", type=int, default=1024)
+    parser.add_argument("--out", default=None, help="JSON results (default benchmarks/results/<time>.json)")
+    parser.add_argument("--compare", default=None, help="earlier results JSON to diff against")
+    args = parser.parse_args()
+
+    report = {"meta": metadata(args), "runs": []}
+    ctx = mp.get_context("spawn")
+    for n_rows in args.sizes:
+        print(f"── {n_rows:,} rows")
+        # Not a multiprocessing.Pool: its daemon workers cannot start the
+        # clean_data.py / n_jobs pools themselves
+        with ProcessPoolExecutor(1, mp_context=ctx) as pool:
+            run = pool.submit(run_size, n_rows, args).result()
+        report["runs"].append(run)
+        build = run["build_s"]
+        print(f"  build {build['total']:.1f}s  "
+              + "  ".join(f"{k} {v:.2f}s" for k, v in build.items() if k != "total"))
+        lat = run["latency_ms"]
+        print(f"  latency p50 {lat['p50']:.3f} ms  p95 {lat['p95']:.3f} ms  p99 {lat['p99']:.3f} ms  "
+              f"batch {run['batch']['products_per_s']:,.0f} products/s  "
+              f"peak rss {run['peak_rss_mb']['query']['self']:,.0f} MB")
+
+    out = args.out or os.path.join(ROOT, "benchmarks", "results",
+                                   time.strftime("bench-%Y%m%d-%H%M%S.json"))
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✔ results written to {out}")
+    if args.compare:
+        compare(args.compare, report["runs"])
+
+
+if __name__ == "__main__":
+    main()
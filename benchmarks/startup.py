@@ -0,0 +1,135 @@
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+# Cold-start budget of the app entry point, every number from a fresh
+# interpreter: per-module import cost (python -X importtime), the import
+# set app.py needs before its first paint, background engine readiness, and
+# (with streamlit installed) the app's own first-paint and first-run times
+# under streamlit's AppTest.
+#
+#   python benchmarks/startup.py --runs 3
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Imported by app.py before the first paint
+SHELL_MODULES = ["streamlit", "streamlit.components.v1", "pandas",
+                 "engine_loader", "filters", "rerank", "metrics", "charts"]
+# Deferred: loader thread (engine) or first chart image (matplotlib)
+DEFERRED_MODULES = ["similarity_engine", "scipy.sparse", "sklearn.feature_extraction.text",
+                    "matplotlib.figure"]
+
+IMPORTTIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def fresh(code):
+    # Run code in a new interpreter from the repo root; its last line is JSON
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else code)
+    return wall, proc
+
+
+def import_seconds(module):
+    # Cumulative import time of module alone, from -X importtime
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=ROOT, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        return None, wall
+    cumulative = [int(m.group(2)) for m in map(IMPORTTIME.match, proc.stderr.splitlines())
+                  if m and m.group(4) == module]
+    return (cumulative[-1] / 1e6 if cumulative else 0.0), wall
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def probe_engine(artifacts, catalog):
+    code = (f"import json, time; start = time.perf_counter()\n"
+            f"from engine_loader import EngineLoader\n"
+            f"loader = EngineLoader({artifacts!r}, {catalog!r}, warm_modules=('matplotlib.figure',))\n"
+            f"loader.wait()\n"
+            f"print(json.dumps(dict(loader.timings, total=time.perf_counter() - start)))")
+    _, proc = fresh(code)
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def probe_app():
+    code = ("import json, time; start = time.perf_counter()\n"
+            "from metrics import METRICS\n"
+            "METRICS.enable()\n"
+            "from streamlit.testing.v1 import AppTest\n"
+            "at = AppTest.from_file('app.py', default_timeout=600)\n"
+            "at.run()\n"
+            "total = time.perf_counter() - start\n"
+            "h = METRICS.snapshot()['histograms']\n"
+            "print(json.dumps({'first paint': h['app_first_paint_seconds']['latest'],\n"
+            "                  'first run': h['app_run_seconds']['latest'],\n"
+            "                  'process': total, 'errors': [str(e.message) for e in at.exception]}))")
+    _, proc = fresh(code)
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time and time-to-first-paint of app.py")
+    parser.add_argument("--runs", type=int, default=3, help="fresh interpreters per measurement")
+    parser.add_argument("--artifacts", default="data/engine")
+    parser.add_argument("--catalog", default=None, help="fitted when --artifacts has no engine")
+    parser.add_argument("--no-app", action="store_true", help="skip the AppTest run")
+    parser.add_argument("--out", default=None, help="also write the results as JSON")
+    args = parser.parse_args()
+    report = {"imports_s": {}}
+
+    print(f"{'module':<34} {'import ms':>10}   (median of {args.runs} fresh interpreters)")
+    for group, modules in (("shell", SHELL_MODULES), ("deferred", DEFERRED_MODULES)):
+        for module in modules:
+            runs = [import_seconds(module)[0] for _ in range(args.runs)]
+            if None in runs:
+                print(f"  {module:<32} {'missing':>10}")
+                continue
+            report["imports_s"][module] = median(runs)
+            print(f"  {module:<32} {median(runs) * 1000:>10.1f}   {group}")
+
+    shell = "import " + ", ".join(SHELL_MODULES)
+    try:
+        walls = [fresh(shell)[0] for _ in range(args.runs)]
+        report["shell_interpreter_s"] = median(walls)
+        print(f"\nshell imports, whole interpreter   {median(walls) * 1000:>8.1f} ms")
+    except RuntimeError as exc:
+        print(f"\nshell imports failed: {exc}")
+
+    ready = [probe_engine(args.artifacts, args.catalog) for _ in range(args.runs)]
+    report["engine_ready_s"] = {k: median([r[k] for r in ready]) for k in ready[0]}
+    print("engine ready (background thread)   "
+          + "  ".join(f"{k} {v:.2f}s" for k, v in report["engine_ready_s"].items()))
+
+    if not args.no_app:
+        try:
+            app = [probe_app() for _ in range(args.runs)]
+        except RuntimeError as exc:
+            print(f"app run skipped: {exc}")
+        else:
+            report["app_s"] = {k: median([r[k] for r in app]) for k in ("first paint", "first run", "process")}
+            print("app.py under AppTest               "
+                  f"first paint {report['app_s']['first paint'] * 1000:.0f} ms (from script start)  "
+                  f"first run {report['app_s']['first run']:.2f}s  "
+                  f"process {report['app_s']['process']:.2f}s")
+            for error in app[-1]["errors"]:
+                print(f"  app error: {error}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+# Synthetic raw feeds shaped like the Flipkart dump clean_data.py reads:
+# same columns and string formats, root categories skewed like the real
+# feed (Clothing alone is ~30%) plus a long tail of one-off roots,
+# lognormal description lengths and Zipf-distributed words, where every
+# category mixes its own topic words into a shared vocabulary.
+
+# Root category -> row count in the 20k-row public Flipkart dump
+CATEGORY_WEIGHTS = {
+    "Clothing": 6198, "Jewellery": 3531, "Footwear": 1227, "Mobiles & Accessories": 1099,
+    "Automotive": 1012, "Home Decor & Festive Needs": 929, "Beauty and Personal Care": 710,
+    "Home Furnishing": 700, "Kitchen & Dining": 647, "Computers": 578, "Watches": 530,
+    "Baby Care": 483, "Tools & Hardware": 391, "Toys & School Supplies": 330,
+    "Pens & Stationery": 313, "Bags, Wallets & Belts": 265, "Furniture": 180,
+    "Sports & Fitness": 166, "Cameras & Accessories": 82, "Home Improvement": 81,
+    "Health & Personal Care Appliances": 43, "Sunglasses": 43, "Gaming": 35,
+    "Pet Supplies": 30, "Home & Kitchen": 24, "Home Entertainment": 21, "eBooks": 15,
+}
+TAIL_SHARE = 0.03        # rows whose root is a one-off (product-name-like) category
+TAIL_CATEGORIES = 500
+VOCAB_SIZE = 30_000
+TOPIC_WORDS = 1_500      # per category
+TOPIC_SHARE = 0.3        # share of description words drawn from the category topic
+DESC_WORDS_MEDIAN = 55
+N_BRANDS = 3_000
+
+SYLLABLES = [c + v for c in "bcdfghjklmnprstvwz" for v in "aeiou"]
+
+
+def _vocabulary(size, rng):
+    # Pronounceable pseudo-words of 2-4 syllables: never stop words, always
+    # tokens under TfidfVectorizer's default pattern
+    n_syl = len(SYLLABLES)
+    lengths = rng.integers(2, 5, size)
+    parts = rng.integers(0, n_syl, (size, 4))
+    words = {"".join(SYLLABLES[p] for p in row[:n]) for row, n in zip(parts.tolist(), lengths)}
+    while len(words) < size:
+        words.add("".join(SYLLABLES[p] for p in rng.integers(0, n_syl, 5)))
+    # Shuffled, so Zipf rank is unrelated to spelling
+    return rng.permutation(np.array(sorted(words)[:size], dtype=object))
+
+
+def _zipf_p(n, s=1.07):
+    p = 1.0 / np.arange(1, n + 1) ** s
+    return p / p.sum()
+
+
+def generate(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    vocab = _vocabulary(VOCAB_SIZE, rng)
+
+    names = list(CATEGORY_WEIGHTS) + [f"Misc Item {i}" for i in range(TAIL_CATEGORIES)]
+    weights = np.array(list(CATEGORY_WEIGHTS.values()), dtype=float)
+    weights = np.concatenate([weights / weights.sum() * (1 - TAIL_SHARE),
+                              np.full(TAIL_CATEGORIES, TAIL_SHARE / TAIL_CATEGORIES)])
+    cats = rng.choice(len(names), size=n_rows, p=weights)
+
+    # Description words: shared Zipf vocabulary plus per-category topic words
+    lengths = np.clip(rng.lognormal(np.log(DESC_WORDS_MEDIAN), 0.6, n_rows), 5, 600).astype(np.int64)
+    row_of = np.repeat(np.arange(n_rows), lengths)
+    words = rng.choice(VOCAB_SIZE, size=len(row_of), p=_zipf_p(VOCAB_SIZE))
+    topical = rng.random(len(row_of)) < TOPIC_SHARE
+    topic_start = (cats[row_of[topical]] * 7919) % (VOCAB_SIZE - TOPIC_WORDS)
+    words[topical] = topic_start + rng.choice(TOPIC_WORDS, size=int(topical.sum()), p=_zipf_p(TOPIC_WORDS))
+    tokens = vocab[words]
+    bounds = np.concatenate([[0], np.cumsum(lengths)])
+    descriptions = [" ".join(tokens[a:b]) for a, b in zip(bounds[:-1].tolist(), bounds[1:].tolist())]
+
+    brands = np.array([f"Brand{vocab[i].capitalize()}" for i in range(N_BRANDS)], dtype=object)
+    brand = brands[rng.choice(N_BRANDS, size=n_rows, p=_zipf_p(N_BRANDS))]
+    title_words = tokens[bounds[:-1]]
+    cat_names = np.array(names, dtype=object)
+    product_name = [f"{b} {w.capitalize()} {c.split()[0]} {i % 97}"
+                    for b, w, c, i in zip(brand, title_words, cat_names[cats], range(n_rows))]
+
+    retail = np.round(rng.lognormal(np.log(900), 1.0, n_rows))
+    discounted = np.round(retail * rng.uniform(0.3, 1.0, n_rows))
+    rated = rng.random(n_rows) < 0.3
+    rating = np.where(rated, np.round(rng.uniform(1, 5, n_rows), 1).astype(str), "No rating available")
+
+    ids = rng.integers(0, 2**63, size=(n_rows, 2), dtype=np.int64)
+    tree = [f'["{c} >> {c} Sub {s} >> Item"]' for c, s in zip(cat_names[cats], rng.integers(0, 20, n_rows))]
+    df = pd.DataFrame({
+        "uniq_id": [f"{a:016x}{b:016x}" for a, b in ids.tolist()],
+        "product_name": product_name,
+        "product_category_tree": tree,
+        "retail_price": retail,
+        "discounted_price": discounted,
+        "image": [f'["http://img5a.flixcart.com/image/p/{i}.jpeg", '
+                  f'"http://img5a.flixcart.com/image/p/{i}-b.jpeg"]' for i in range(n_rows)],
+        "description": descriptions,
+        "product_rating": rating,
+        "overall_rating": rating,
+        "brand": brand,
+    })
+    # The real feed has gaps that the cleaning step drops
+    df.loc[rng.random(n_rows) < 0.01, "description"] = np.nan
+    df.loc[rng.random(n_rows) < 0.02, "image"] = np.nan
+    df.loc[rng.random(n_rows) < 0.25, "brand"] = np.nan
+    return df
+
+
+def parse_size(text):
+    # "10k" -> 10_000, "1M" -> 1_000_000
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1].lower(), 1)
+    return int(float(text[:-1] if scale > 1 else text) * scale)
+
+
+def raw_feed(n_rows, directory, seed=0):
+    # Cached per (size, seed): generating 1M rows takes a while
+    path = os.path.join(directory, f"flipkart_synthetic_{n_rows}_{seed}.csv")
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        generate(n_rows, seed).to_csv(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic Flipkart-shaped raw feed")
+    parser.add_argument("--rows", type=parse_size, default=parse_size("10k"))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="benchmarks/data")
+    args = parser.parse_args()
+    print(raw_feed(args.rows, args.out, args.seed))
+
+
+if __name__ == "__main__":
+    main()
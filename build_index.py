@@ -0,0 +1,55 @@
+import argparse
+import time
+
+from ann_index import IVFIndex
+from catalog import default_catalog_path
+from embedding import LSAEmbedding
+from quantize import STORAGE_DTYPES
+from sharding import build_shards
+from similarity_engine import SimilarityEngine
+
+# Fit the engine once and write its artifacts, so app workers can
+# SimilarityEngine.load() them (memory-mapped) instead of refitting.
+
+parser = argparse.ArgumentParser(description="Build persisted similarity engine artifacts")
+parser.add_argument("--catalog", default=default_catalog_path(),
+                    help="typed Parquet catalog (or products_clean.csv)")
+parser.add_argument("--out", default="data/engine")
+parser.add_argument("--mode", choices=SimilarityEngine.MODES, default="topk")
+parser.add_argument("--k", type=int, default=50)
+parser.add_argument("--block-size", type=int, default=1024)
+parser.add_argument("--dtype", choices=STORAGE_DTYPES, default="float32",
+                    help="score storage; int8 keeps a float32 scale per row")
+parser.add_argument("--n-components", type=int, default=128, help="ann/embedding modes: SVD dimensions")
+parser.add_argument("--nlist", type=int, default=None, help="ann mode: lists per category")
+parser.add_argument("--nprobe", type=int, default=8, help="ann mode: lists probed per query")
+parser.add_argument("--n-jobs", type=int, default=1,
+                    help="processes for tokenization and topk neighbour lists (-1: all cores)")
+parser.add_argument("--shards", type=int, default=0,
+                    help="split the catalog by category into this many shard engines under --out "
+                         "(serve with server.py --shards)")
+args = parser.parse_args()
+
+start = time.perf_counter()
+ann_index = IVFIndex(n_components=args.n_components, nlist=args.nlist, nprobe=args.nprobe)
+engine_kwargs = dict(mode=args.mode, k=args.k, block_size=args.block_size, ann_index=ann_index,
+                     dtype=args.dtype, embedding=LSAEmbedding(n_components=args.n_components))
+if args.shards:
+    manifest, timings = build_shards(args.catalog, args.out, args.shards, n_jobs=args.n_jobs,
+                                     **engine_kwargs)
+    print(f"✔ built {sum(s['rows'] for s in manifest['shards']):,} products in "
+          f"{manifest['n_shards']} shards under {args.out} in {time.perf_counter() - start:.1f}s")
+    for shard in manifest["shards"]:
+        print(f"  {shard['path']:<10} {shard['rows']:>8,} rows  {len(shard['categories']):>4} categories")
+    for stage, seconds in timings.items():
+        print(f"  {stage:<20} {seconds:>8.2f}s")
+    raise SystemExit
+
+engine = SimilarityEngine(args.catalog, n_jobs=args.n_jobs, **engine_kwargs)
+built = time.perf_counter()
+engine.save(args.out)
+
+print(f"✔ built {len(engine.data):,} products in {built - start:.1f}s, "
+      f"saved to {args.out} in {time.perf_counter() - built:.1f}s")
+for stage, seconds in engine.build_timings.items():
+    print(f"  {stage:<20} {seconds:>8.2f}s")
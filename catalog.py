@@ -0,0 +1,118 @@
+import os
+
+import pandas as pd
+
+# Typed product catalog shared by the cleaning pipeline, the engine and the
+# app: numeric prices/ratings, categorical category/brand and a precleaned
+# category label, so nothing downstream re-parses strings per render.
+
+CATALOG_COLUMNS = ['product_id', 'product_name', 'description', 'image', 'brand',
+                   'retail_price', 'discounted_price', 'overall_rating',
+                   'category', 'category_label']
+NUMERIC_COLUMNS = ['retail_price', 'discounted_price', 'overall_rating']
+# Not in the Flipkart feed, but read when a catalog has them: in_stock for
+# the in-stock filter (filters.py), popularity for re-ranking (rerank.py)
+OPTIONAL_COLUMNS = ['in_stock', 'popularity']
+CATEGORICAL_COLUMNS = ['category', 'category_label', 'brand']
+
+PARQUET_PATH = 'data/products_clean.parquet'
+CSV_PATH = 'data/products_clean.csv'
+
+
+def category_label(category):
+    # '["Clothing ' -> 'Clothing'; empty labels become NaN
+    label = (category.astype("string")
+             .str.replace(r'^\[["\']?', '', regex=True)
+             .str.replace(r'["\'].*$', '', regex=True)
+             .str.split('>>').str[0]
+             .str.strip().str.strip('"\''))
+    return label.where(label.str.len() > 0).astype(object)
+
+
+def assign_product_ids(df):
+    # Keep feed ids (uniq_id) where present; otherwise derive a stable id from
+    # the product content so it survives rebuilds. Duplicates get a -N suffix.
+    fields = df.columns.intersection(['product_name', 'description', 'image'])
+    content = pd.util.hash_pandas_object(df[fields].astype(str), index=False)
+    derived = pd.Series(content.to_numpy(), index=df.index).map('{:016x}'.format)
+    ids = df['product_id'].astype(object) if 'product_id' in df.columns else derived
+    ids = ids.where(ids.notna(), derived).astype(str)
+    if ids.duplicated().any():
+        seen = ids.groupby(ids).cumcount()
+        ids = ids.where(seen == 0, ids + '-' + seen.astype(str))
+    return df.assign(product_id=ids)
+
+
+def typed_catalog(df):
+    # Idempotent: safe on raw clean CSV rows, Parquet rows and update deltas
+    df = df.copy()
+    for col in NUMERIC_COLUMNS:
+        if col in df.columns:
+            # "No rating available" and friends become NaN
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('float32')
+    if 'popularity' in df.columns:
+        df['popularity'] = pd.to_numeric(df['popularity'], errors='coerce').astype('float32')
+    if 'in_stock' in df.columns:
+        df['in_stock'] = df['in_stock'].astype('boolean')
+    if 'category' in df.columns:
+        # Empty roots read back from CSV as NaN; treat them the same everywhere
+        df['category'] = df['category'].mask(df['category'] == '')
+    if 'category' in df.columns and 'category_label' not in df.columns:
+        df['category_label'] = category_label(df['category'])
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category').cat.remove_unused_categories()
+    return df
+
+
+def catalog_schema():
+    # One Arrow schema for every Parquet part, so a chunk where a column is
+    # all null (e.g. no brands) is still typed like the others
+    import pyarrow as pa
+    types = {col: pa.float32() for col in NUMERIC_COLUMNS}
+    types.update({col: pa.dictionary(pa.int32(), pa.string()) for col in CATEGORICAL_COLUMNS})
+    return pa.schema([(col, types.get(col, pa.string())) for col in CATALOG_COLUMNS])
+
+
+def default_catalog_path():
+    return PARQUET_PATH if os.path.exists(PARQUET_PATH) else CSV_PATH
+
+
+def _widen_categories(df, new):
+    # Give both frames the same categories so concat/assignment keeps the dtype
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns and col in new.columns:
+            new[col] = new[col].astype('category')
+            missing = new[col].cat.categories.difference(df[col].cat.categories)
+            if len(missing):
+                df[col] = df[col].cat.add_categories(missing)
+            new[col] = new[col].cat.set_categories(df[col].cat.categories)
+
+
+def append_rows(df, new):
+    new = typed_catalog(new).reindex(columns=df.columns)
+    _widen_categories(df, new)
+    return pd.concat([df, new], ignore_index=True)
+
+
+def update_rows(df, rows, new):
+    # In place: overwrite the columns present in new at positional rows
+    new = typed_catalog(new)
+    new = new[new.columns.intersection(df.columns)]
+    _widen_categories(df, new)
+    for col in new.columns:
+        df.loc[rows, col] = new[col].to_numpy()
+
+
+def load_catalog(path, columns=CATALOG_COLUMNS, optional=OPTIONAL_COLUMNS):
+    # Parquet (file or partitioned dataset) is read with column projection;
+    # CSV is still accepted and typed on the fly. The optional columns come
+    # along when the catalog has them.
+    if os.path.isdir(path) or path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        names = pq.ParquetDataset(path).schema.names
+        df = pd.read_parquet(path, columns=list(columns) + [c for c in optional if c in names])
+    else:
+        wanted = set(columns) | set(optional)
+        df = pd.read_csv(path, usecols=lambda c: c in wanted)
+    return assign_product_ids(typed_catalog(df).reset_index(drop=True))
@@ -0,0 +1,187 @@
+import io
+
+from result_cache import ResultCache
+
+# Charts for app.py, in two flavours: PNG images rendered with matplotlib
+# (cached, so a repeat lookup never re-rasterizes) and light Vega-Lite specs
+# the browser draws itself. Figures are built through the object API, not
+# pyplot, so concurrent Streamlit sessions never share global figure state.
+# matplotlib itself is only imported once an image is first rendered.
+
+STYLES = ("Image", "Interactive", "Off")
+# Rendered PNGs kept per process, shared by every session
+CACHED_IMAGES = 256
+DPI = 200
+
+BG = '#0f0d18'
+TRACK = '#1a1728'
+TEXT = '#e8e4dc'
+MUTED = '#9994a8'
+AXIS = '#45424f'
+SESSION_COLORS = ["#ff8c00", "#ff3c64", "#a259ff", "#00c9a7", "#ffd600"]
+FLAME = [(0.00, "#0d0b12"), (0.30, "#1a0e18"), (0.55, "#5c1a00"),
+         (0.75, "#c04800"), (0.88, "#ff8c00"), (1.00, "#ffe066")]
+
+images = ResultCache(CACHED_IMAGES)
+
+
+def cached_png(key, version, render):
+    # key names the chart and the result set it draws; version is the
+    # engine's catalog version, so catalog updates retire old images
+    hit, png = images.get(key, version)
+    if not hit:
+        png = render()
+        images.put(key, version, png)
+    return png
+
+
+def score_color(score):
+    return "#4caf7d" if score >= 0.7 else ("#ff8c00" if score >= 0.4 else "#ff3c64")
+
+
+def _figure(size):
+    from matplotlib.figure import Figure
+    return Figure(figsize=size, facecolor=BG)
+
+
+def _png(fig):
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", dpi=DPI, bbox_inches="tight", facecolor=fig.get_facecolor())
+    return buf.getvalue()
+
+
+def _style_axes(ax):
+    for spine in ax.spines.values():
+        spine.set_edgecolor(TRACK)
+    ax.xaxis.grid(True, color=TRACK, linewidth=0.8)
+    ax.set_axisbelow(True)
+    ax.tick_params(colors=MUTED, labelsize=9)
+
+
+# ─── Matplotlib images ───────────────────────────────────────────────────────
+
+def similarity_bars_png(names, scores):
+    fig = _figure((10, 3.2))
+    ax = fig.subplots()
+    ax.set_facecolor(BG)
+    ax.barh(names, [1] * len(names), color=TRACK, height=0.55, zorder=1)
+    bars = ax.barh(names, scores, color=[score_color(s) for s in scores],
+                   height=0.55, zorder=2, alpha=0.92)
+    for bar, score in zip(bars, scores):
+        ax.text(score + 0.02, bar.get_y() + bar.get_height() / 2, f'{score:.3f}',
+                va='center', ha='left', color=TEXT, fontsize=9.5,
+                fontfamily='monospace', fontweight='bold')
+    ax.set_xlim(0, 1.18)
+    ax.set_xlabel('Similarity Score', color=AXIS, fontsize=9)
+    _style_axes(ax)
+    ax.tick_params(axis='x', colors=AXIS)
+    fig.tight_layout(pad=1.2)
+    return _png(fig)
+
+
+def heatmap_png(labels, matrix):
+    import matplotlib.colors as mcolors
+    fig = _figure((8, 5.5))
+    ax = fig.subplots()
+    ax.set_facecolor(BG)
+    cmap = mcolors.LinearSegmentedColormap.from_list("flame", FLAME)
+    im = ax.imshow(matrix, cmap=cmap, vmin=0, vmax=1, aspect='auto')
+    for i in range(len(labels)):
+        for j in range(len(labels)):
+            v = matrix[i][j]
+            ax.text(j, i, f'{v:.2f}', ha='center', va='center', fontsize=8,
+                    color='#000' if v > 0.7 else TEXT, fontweight='bold')
+    ax.set_xticks(range(len(labels)))
+    ax.set_yticks(range(len(labels)))
+    ax.set_xticklabels(labels, rotation=35, ha='right', color=MUTED, fontsize=8)
+    ax.set_yticklabels(labels, color=MUTED, fontsize=8)
+    for spine in ax.spines.values():
+        spine.set_edgecolor(TRACK)
+    cb = fig.colorbar(im, ax=ax, fraction=0.03, pad=0.03)
+    cb.ax.tick_params(colors=MUTED, labelsize=8)
+    cb.outline.set_edgecolor(TRACK)
+    fig.tight_layout(pad=1.5)
+    return _png(fig)
+
+
+def session_bars_png(names, counts):
+    fig = _figure((9, 2.8))
+    ax = fig.subplots()
+    ax.set_facecolor(BG)
+    max_v = max(counts) if counts else 1
+    ax.barh(names, [max_v] * len(names), color=TRACK, height=0.5, zorder=1)
+    ax.barh(names, counts, color=SESSION_COLORS[:len(names)], height=0.5, zorder=2, alpha=0.9)
+    for i, val in enumerate(counts):
+        ax.text(val + max_v * 0.02, i, f' {val} search{"es" if val > 1 else ""}',
+                va='center', color=TEXT, fontsize=9.5, fontweight='bold')
+    ax.set_xlim(0, max_v * 1.5)
+    ax.set_xlabel('Searches', color=AXIS, fontsize=9)
+    _style_axes(ax)
+    fig.tight_layout(pad=1.2)
+    return _png(fig)
+
+
+# ─── Vega-Lite specs (drawn client-side) ─────────────────────────────────────
+
+def _spec(values, layers, height):
+    return {
+        "data": {"values": values},
+        "height": height,
+        "layer": layers,
+        "config": {"background": BG, "view": {"stroke": None},
+                   "axis": {"labelColor": MUTED, "titleColor": AXIS, "gridColor": TRACK,
+                            "domainColor": TRACK, "tickColor": TRACK, "labelLimit": 260}},
+    }
+
+
+def similarity_bars_spec(names, scores):
+    values = [{"name": n, "score": round(s, 3), "color": score_color(s)}
+              for n, s in zip(names, scores)]
+    y = {"field": "name", "type": "nominal", "sort": None, "title": None}
+    return _spec(values, [
+        {"mark": {"type": "bar", "cornerRadiusEnd": 3},
+         "encoding": {"y": y,
+                      "x": {"field": "score", "type": "quantitative", "title": "Similarity Score",
+                            "scale": {"domain": [0, 1.18]}},
+                      "color": {"field": "color", "type": "nominal", "scale": None},
+                      "tooltip": [{"field": "name"}, {"field": "score"}]}},
+        {"mark": {"type": "text", "align": "left", "dx": 4, "color": TEXT, "fontWeight": "bold"},
+         "encoding": {"y": y, "x": {"field": "score", "type": "quantitative"},
+                      "text": {"field": "score", "format": ".3f"}}},
+    ], 34 * len(values))
+
+
+def heatmap_spec(labels, matrix):
+    # Labels are made unique by position so equal product names stay apart
+    keys = [f"{i}. {label}" for i, label in enumerate(labels)]
+    values = [{"x": keys[j], "y": keys[i], "v": round(float(matrix[i][j]), 2)}
+              for i in range(len(keys)) for j in range(len(keys))]
+    axis = {"type": "ordinal", "sort": keys, "title": None}
+    return _spec(values, [
+        {"mark": "rect",
+         "encoding": {"x": dict(axis, field="x", axis={"labelAngle": -35}), "y": dict(axis, field="y"),
+                      "color": {"field": "v", "type": "quantitative",
+                                "scale": {"domain": [s for s, _ in FLAME], "range": [c for _, c in FLAME]},
+                                "legend": {"labelColor": MUTED, "title": None}},
+                      "tooltip": [{"field": "y"}, {"field": "x"}, {"field": "v"}]}},
+        {"mark": {"type": "text", "fontWeight": "bold", "fontSize": 10},
+         "encoding": {"x": dict(axis, field="x"), "y": dict(axis, field="y"),
+                      "text": {"field": "v", "format": ".2f"},
+                      "color": {"condition": {"test": "datum.v > 0.7", "value": "#000"}, "value": TEXT}}},
+    ], 40 * len(keys))
+
+
+def session_bars_spec(names, counts):
+    values = [{"name": n, "count": c, "color": SESSION_COLORS[i % len(SESSION_COLORS)]}
+              for i, (n, c) in enumerate(zip(names, counts))]
+    y = {"field": "name", "type": "nominal", "sort": None, "title": None}
+    return _spec(values, [
+        {"mark": {"type": "bar", "cornerRadiusEnd": 3},
+         "encoding": {"y": y,
+                      "x": {"field": "count", "type": "quantitative", "title": "Searches",
+                            "axis": {"tickMinStep": 1}},
+                      "color": {"field": "color", "type": "nominal", "scale": None}}},
+        {"mark": {"type": "text", "align": "left", "dx": 4, "color": TEXT, "fontWeight": "bold"},
+         "encoding": {"y": y, "x": {"field": "count", "type": "quantitative"},
+                      "text": {"field": "count"}}},
+    ], 34 * len(values))
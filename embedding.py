@@ -0,0 +1,93 @@
+import numpy as np
+from sklearn.decomposition import TruncatedSVD
+
+
+def normalize_rows(X):
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return X / norms
+
+
+def fit_components(tfidf_rows, n_components, random_state=0):
+    # TruncatedSVD basis as a float32 (n_components, n_features) array
+    n_components = max(1, min(n_components, tfidf_rows.shape[1] - 1))
+    svd = TruncatedSVD(n_components=n_components, random_state=random_state)
+    svd.fit(tfidf_rows)
+    return svd.components_.astype(np.float32)
+
+
+def project(tfidf_matrix, components, rows=None, chunk_size=50_000):
+    # L2-normalised float32 embeddings of rows (all rows by default),
+    # computed one chunk at a time so the dense result is the only big array
+    n = tfidf_matrix.shape[0] if rows is None else len(rows)
+    out = np.empty((n, len(components)), dtype=np.float32)
+    for start in range(0, n, chunk_size):
+        stop = min(start + chunk_size, n)
+        chunk = tfidf_matrix[start:stop] if rows is None else tfidf_matrix[rows[start:stop]]
+        out[start:stop] = normalize_rows(chunk @ components.T)
+    return out
+
+
+class LSAEmbedding:
+    # Dense low-rank (LSA) view of the TF-IDF rows: a TruncatedSVD projection,
+    # L2-normalised and kept as one contiguous float32 array. Rows are laid
+    # out category by category, so a category's candidates are a single
+    # block and scoring is one GEMV per query or one GEMM per batch.
+
+    def __init__(self, n_components=128, max_train=50_000, chunk_size=50_000, random_state=0):
+        self.n_components = n_components
+        self.max_train = max_train
+        self.chunk_size = chunk_size
+        self.random_state = random_state
+
+    def params(self):
+        return {"n_components": self.n_components}
+
+    def build(self, tfidf_matrix, category_rows):
+        rng = np.random.default_rng(self.random_state)
+        n_rows = tfidf_matrix.shape[0]
+
+        # SVD fitted on a sample, applied to all rows in chunks
+        train = rng.choice(n_rows, size=min(n_rows, self.max_train), replace=False)
+        self.components = fit_components(tfidf_matrix[np.sort(train)], self.n_components,
+                                         self.random_state)
+
+        # Category blocks first, rows without a category at the end
+        grouped = list(category_rows)
+        categorized = np.concatenate(grouped) if grouped else np.empty(0, dtype=np.int32)
+        rest = np.setdiff1d(np.arange(n_rows), categorized)
+        self.row_order = np.concatenate([categorized, rest]).astype(np.int32)
+        self.category_offsets = np.concatenate(
+            [[0], np.cumsum([len(rows) for rows in grouped], dtype=np.int64)]).astype(np.int64)
+        self.positions = np.empty(n_rows, dtype=np.int64)
+        self.positions[self.row_order] = np.arange(n_rows)
+
+        self.vectors = project(tfidf_matrix, self.components, self.row_order, self.chunk_size)
+        return self
+
+    def category_block(self, code):
+        # (row ids, embeddings) of one category, both ascending by row id
+        start, stop = self.category_offsets[code], self.category_offsets[code + 1]
+        return self.row_order[start:stop], self.vectors[start:stop]
+
+    def vectors_for(self, rows):
+        return self.vectors[self.positions[rows]]
+
+    def transform(self, tfidf_rows):
+        return project(tfidf_rows, self.components, chunk_size=self.chunk_size)
+
+    def arrays(self):
+        return {
+            "components": self.components,
+            "vectors": self.vectors,
+            "row_order": self.row_order,
+            "category_offsets": self.category_offsets,
+            "positions": self.positions,
+        }
+
+    @classmethod
+    def from_arrays(cls, params, arrays):
+        embedding = cls(**params)
+        for name, arr in arrays.items():
+            setattr(embedding, name, arr)
+        return embedding
@@ -0,0 +1,77 @@
+import importlib
+import os
+import threading
+import time
+
+from metrics import METRICS
+
+# Loads the SimilarityEngine on a background thread, so the app can paint its
+# shell while the heavy imports (scipy, scikit-learn) and the artifact load
+# or fit run. ready is set once the engine is loaded and warmed up, or once
+# loading failed (then error holds the exception).
+
+
+class EngineLoader:
+    def __init__(self, artifacts="data/engine", catalog=None, warm_modules=()):
+        self.artifacts = artifacts
+        self.catalog = catalog
+        # Imported after the engine is up, so their first use is cheap too
+        self.warm_modules = warm_modules
+        self.engine = None
+        self.error = None
+        self.stage = "starting"
+        self.timings = {}
+        self.ready = threading.Event()
+        threading.Thread(target=self._run, name="engine-loader", daemon=True).start()
+
+    def _timed(self, stage, fn):
+        self.stage = stage
+        start = time.perf_counter()
+        result = fn()
+        self.timings[stage] = time.perf_counter() - start
+        METRICS.observe("engine_ready_seconds", self.timings[stage], stage=stage)
+        return result
+
+    def _run(self):
+        try:
+            engine_cls = self._timed("importing", self._import_engine)
+            engine = self._timed("loading", lambda: self._load(engine_cls))
+            self._timed("warming up", lambda: self._warm_up(engine))
+            self.engine = engine
+            self.stage = "ready"
+        except Exception as exc:
+            self.error = exc
+            self.stage = "failed"
+        finally:
+            self.ready.set()
+
+    def _import_engine(self):
+        from similarity_engine import SimilarityEngine
+        return SimilarityEngine
+
+    def _load(self, engine_cls):
+        # Prebuilt artifacts (python build_index.py) load memory-mapped in milliseconds
+        if os.path.exists(os.path.join(self.artifacts, "manifest.json")):
+            return engine_cls.load(self.artifacts)
+        from catalog import default_catalog_path
+        return engine_cls(self.catalog or default_catalog_path(), mode="topk")
+
+    def _warm_up(self, engine):
+        # Build the lookup indexes the first request would otherwise pay for
+        engine.search_index
+        engine.id_index
+        engine.result_columns
+        engine.facets
+        categorized = (engine.category_codes >= 0).nonzero()[0]
+        if len(categorized):
+            engine._ranked_neighbors(int(categorized[0]), 5)
+        for module in self.warm_modules:
+            importlib.import_module(module)
+
+    def wait(self, timeout=None):
+        # The engine once ready; re-raises a loading failure
+        if not self.ready.wait(timeout):
+            raise TimeoutError(f"engine still {self.stage} after {timeout}s")
+        if self.error is not None:
+            raise self.error
+        return self.engine
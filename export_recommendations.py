@@ -0,0 +1,109 @@
+import argparse
+import multiprocessing as mp
+import os
+import time
+from collections import deque
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
+from similarity_engine import SimilarityEngine
+
+# Offline precompute: top-N neighbours for every live product, written in
+# chunks. Workers memory-map the same artifacts (see build_index.py), so
+# adding processes costs little extra RAM, and only a fixed window of chunks
+# is ever in flight.
+
+# Chunks per worker submitted ahead of the writer
+IN_FLIGHT = 2
+
+_engine = None
+
+
+def _init_worker(artifacts):
+    global _engine
+    _engine = SimilarityEngine.load(artifacts)
+
+
+def _recommend_chunk(job):
+    rows, top_n = job
+    result = _engine.get_similar_products_batch(rows, top_n)
+    ids = _engine.data["product_id"].to_numpy()
+    return pd.DataFrame({
+        "product_id":    ids[result["query"]],
+        "similar_id":    ids[result["neighbor"]],
+        "product_index": result["query"],
+        "rank":          result["rank"],
+        "similar_index": result["neighbor"],
+        "score":         result["score"].round(4),
+    })
+
+
+class ChunkWriter:
+    def __init__(self, path):
+        self.path = path
+        self.parquet = path.endswith(".parquet")
+        self.writer = None
+        self.rows = 0
+
+    def write(self, frame):
+        if self.parquet:
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise SystemExit("Parquet output needs pyarrow: pip install pyarrow")
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self.writer is None:
+                self.writer = pq.ParquetWriter(self.path, table.schema)
+            self.writer.write_table(table)
+        else:
+            frame.to_csv(self.path, mode="a" if self.rows else "w", header=not self.rows, index=False)
+        self.rows += len(frame)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export top-N similar products for the whole catalog")
+    parser.add_argument("--artifacts", default="data/engine", help="output of build_index.py")
+    parser.add_argument("--out", default="data/recommendations.parquet", help=".parquet or .csv")
+    parser.add_argument("--top-n", type=int, default=10)
+    parser.add_argument("--chunk-size", type=int, default=20_000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    engine = SimilarityEngine.load(args.artifacts)
+    live = np.flatnonzero(~np.asarray(engine.deleted)).astype(np.int32)
+    jobs = [(live[i:i + args.chunk_size], args.top_n) for i in range(0, len(live), args.chunk_size)]
+    del engine
+
+    writer = ChunkWriter(args.out)
+    with mp.Pool(args.workers, initializer=_init_worker, initargs=(args.artifacts,)) as pool:
+        # At most IN_FLIGHT chunks per worker are submitted and not yet
+        # written, so a slow writer bounds memory instead of buffering
+        # finished chunks; results are written in catalog order
+        pending = deque()
+        remaining = iter(jobs)
+        for job in islice(remaining, args.workers * IN_FLIGHT):
+            pending.append(pool.apply_async(_recommend_chunk, (job,)))
+        done = 0
+        while pending:
+            frame = pending.popleft().get()
+            job = next(remaining, None)
+            if job is not None:
+                pending.append(pool.apply_async(_recommend_chunk, (job,)))
+            writer.write(frame)
+            done += 1
+            print(f"  chunk {done}/{len(jobs)}  {writer.rows:,} rows written", flush=True)
+    writer.close()
+
+    print(f"✔ {len(live):,} products → {args.out} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
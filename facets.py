@@ -0,0 +1,43 @@
+import numpy as np
+
+# Catalog facets for the UI, computed once per catalog version and shared by
+# every session through the engine: category labels with product counts,
+# catalog totals, the brand list, the price range, a fixed sample of product
+# images and paged listings of each label's products. A rerun reads these
+# in O(page) instead of re-scanning the catalog.
+
+SAMPLE_IMAGES = 8
+
+
+class CatalogFacets:
+    def __init__(self, data, deleted, seed=0):
+        live = ~np.asarray(deleted)
+        self.live_rows = np.flatnonzero(live).astype(np.int32)
+        self.n_products = len(self.live_rows)
+
+        # Live rows grouped by label, catalog order within each label
+        labels = data["category_label"].cat
+        codes = np.where(live, labels.codes.to_numpy(np.int32), -1)
+        order = np.argsort(codes, kind="stable").astype(np.int32)
+        bounds = np.searchsorted(codes[order], np.arange(len(labels.categories) + 1))
+        self.label_rows = {label: order[bounds[i]:bounds[i + 1]]
+                           for i, label in enumerate(labels.categories) if bounds[i + 1] > bounds[i]}
+        self.labels = sorted(self.label_rows)
+        self.label_counts = {label: len(self.label_rows[label]) for label in self.labels}
+
+        self.n_categories = int(data["category"][live].nunique())
+        brand = data["brand"].cat
+        present = np.bincount(brand.codes.to_numpy()[live] + 1, minlength=len(brand.categories) + 1)[1:]
+        self.brands = [name for name, n in zip(brand.categories.tolist(), present.tolist()) if n]
+        self.price_max = float(np.nanmax(data["discounted_price"].to_numpy()[live], initial=0))
+
+        images = data["image"].to_numpy(dtype=object)[self.live_rows]
+        with_image = self.live_rows[[isinstance(url, str) and url.startswith("http") for url in images]]
+        picked = np.random.default_rng(seed).choice(
+            with_image, min(SAMPLE_IMAGES, len(with_image)), replace=False)
+        self.sample_images = data["image"].to_numpy(dtype=object)[picked].tolist()
+
+    def listing(self, label=None, limit=50, offset=0):
+        # (page of row ids, total) for a label, or the whole catalog for None
+        rows = self.live_rows if label is None else self.label_rows.get(label, self.live_rows[:0])
+        return rows[offset:offset + limit], len(rows)
@@ -0,0 +1,131 @@
+import numpy as np
+import pandas as pd
+
+# Recommendation filters. Predicates combine with & into one Filter (a
+# conjunction) that compiles to a boolean mask over the catalog; the engine
+# applies the mask inside top-k selection, so a filtered query still gets
+# top_n results whenever enough eligible products exist.
+#
+#   f = price_between(200, 1500) & min_rating(4) & exclude_brands(["Acme"])
+#   engine.get_similar_products(row, top_n=5, filters=f)
+
+
+class Filter:
+    # Predicates are (name, *args) tuples. key is canonical and hashable, so
+    # equal filters share compiled masks and result-cache entries.
+
+    def __init__(self, predicates=()):
+        self.key = tuple(sorted(set(predicates)))
+
+    def __and__(self, other):
+        return Filter(self.key + other.key)
+
+    def __bool__(self):
+        return bool(self.key)
+
+    def __eq__(self, other):
+        return isinstance(other, Filter) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return " & ".join(f"{name}{args!r}" for name, *args in self.key) or "Filter()"
+
+    @classmethod
+    def from_params(cls, params):
+        # From query-string / JSON style parameters:
+        #   min_price, max_price, min_rating, brand, exclude_brand, in_stock
+        # brand and exclude_brand take one name or a list of names
+        unknown = set(params) - set(PARAMS)
+        if unknown:
+            raise ValueError(f"unknown filter {sorted(unknown)[0]!r}, expected one of {list(PARAMS)}")
+        f = cls()
+        for name, value in params.items():
+            if value is None or value == "" or value == []:
+                continue
+            f = f & PARAMS[name](value)
+        return f
+
+
+def price_between(low=None, high=None):
+    # Discounted price in [low, high]; products without a price never match
+    predicates = []
+    if low is not None:
+        predicates.append(("min_price", float(low)))
+    if high is not None:
+        predicates.append(("max_price", float(high)))
+    return Filter(predicates)
+
+
+def min_rating(rating):
+    # Unrated products never match
+    return Filter([("min_rating", float(rating))])
+
+
+def brands(names):
+    return Filter([("brand", tuple(sorted(set(_names(names)))))])
+
+
+def exclude_brands(names):
+    # Products without a brand are kept
+    return Filter([("exclude_brand", tuple(sorted(set(_names(names)))))])
+
+
+def in_stock():
+    # The Flipkart feed has no stock levels: an in_stock column is used when
+    # the catalog has one, otherwise a product counts as in stock when it is
+    # listed with a price
+    return Filter([("in_stock",)])
+
+
+def _names(value):
+    return [value] if isinstance(value, str) else list(value)
+
+
+def _flag(value):
+    if isinstance(value, str):
+        if value.lower() in ("1", "true", "yes"):
+            return True
+        if value.lower() in ("0", "false", "no"):
+            return False
+        raise ValueError(f"in_stock must be true or false, got {value!r}")
+    return bool(value)
+
+
+PARAMS = {
+    "min_price":     lambda v: price_between(low=v),
+    "max_price":     lambda v: price_between(high=v),
+    "min_rating":    min_rating,
+    "brand":         brands,
+    "exclude_brand": exclude_brands,
+    "in_stock":      lambda v: in_stock() if _flag(v) else Filter(),
+}
+
+
+def _brand_mask(data, names):
+    brand = data["brand"].cat
+    codes = brand.categories.get_indexer(pd.Index(names, dtype=object))
+    return np.isin(brand.codes.to_numpy(), codes[codes >= 0])
+
+
+def _stock_mask(data):
+    if "in_stock" in data.columns:
+        return data["in_stock"].fillna(False).to_numpy(dtype=bool)
+    return data["discounted_price"].to_numpy() > 0
+
+
+# NaN compares False, so missing prices/ratings fail numeric predicates
+PREDICATES = {
+    "min_price":     lambda data, v: data["discounted_price"].to_numpy() >= v,
+    "max_price":     lambda data, v: data["discounted_price"].to_numpy() <= v,
+    "min_rating":    lambda data, v: data["overall_rating"].to_numpy() >= v,
+    "brand":         _brand_mask,
+    "exclude_brand": lambda data, names: ~_brand_mask(data, names),
+    "in_stock":      _stock_mask,
+}
+
+
+def predicate_mask(data, predicate):
+    name, *args = predicate
+    return np.asarray(PREDICATES[name](data, *args), dtype=bool)
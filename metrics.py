@@ -0,0 +1,244 @@
+import json
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager
+
+# Process-wide timers, counters and histograms for the hot paths (engine
+# build and queries, the HTTP server, app rendering). Off by default: then
+# timer() hands back one shared no-op context manager, so instrumented code
+# pays an attribute check and an empty with-block. METRICS.enable() turns
+# recording on; snapshot() / to_prometheus() dump everything recorded.
+#
+#   with METRICS.timer("similar_stage_seconds", stage="rank"):
+#       ...
+
+# Histogram bucket upper bounds, seconds
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+           0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ("metrics", "key", "start")
+
+    def __init__(self, metrics, key):
+        self.metrics = metrics
+        self.key = key
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics._observe(self.key, time.perf_counter() - self.start)
+        return False
+
+
+class Histogram:
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.latest = 0.0
+
+    def observe(self, value):
+        self.buckets[bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        self.latest = value
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def _series(name, labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return name
+    return name + "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+class SlowRequestProfiler:
+    # Opt-in sampling profiler. While a tracked request runs, a daemon thread
+    # samples its stack every interval seconds. Requests slower than
+    # threshold keep the aggregated stacks (collapsed "outer;...;inner"
+    # format, flamegraph-ready) in .profiles and are passed to every hook;
+    # faster ones are dropped.
+
+    def __init__(self, threshold=0.2, interval=0.005, depth=16, keep=20):
+        self.threshold = threshold
+        self.interval = interval
+        self.depth = depth
+        self.profiles = deque(maxlen=keep)
+        self.hooks = []
+        self._active = {}
+        self._lock = threading.Lock()
+        threading.Thread(target=self._sample, name="slow-request-profiler", daemon=True).start()
+
+    def _stack(self, frame):
+        names = []
+        while frame is not None and len(names) < self.depth:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def _sample(self):
+        while True:
+            time.sleep(self.interval)
+            if not self._active:
+                continue
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, samples in self._active.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        samples[self._stack(frame)] += 1
+
+    @contextmanager
+    def track(self, name):
+        thread_id = threading.get_ident()
+        if thread_id in self._active:
+            # Nested request on the same thread: the outer one is sampling
+            yield
+            return
+        samples = Counter()
+        with self._lock:
+            self._active[thread_id] = samples
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                del self._active[thread_id]
+            if elapsed >= self.threshold:
+                record = {"name": name, "seconds": elapsed, "at": time.time(),
+                          "samples": sum(samples.values()), "stacks": samples.most_common(20)}
+                self.profiles.append(record)
+                for hook in self.hooks:
+                    hook(record)
+
+
+class Metrics:
+    def __init__(self):
+        self.enabled = False
+        self.profiler = None
+        self._profiler = None
+        self._lock = threading.Lock()
+        self.counters = Counter()
+        self.histograms = defaultdict(Histogram)
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def enable_profiler(self, threshold_ms=200, interval_ms=5):
+        # Slow-request sampling for request() blocks; also enables recording
+        self.enabled = True
+        if self._profiler is None:
+            self._profiler = SlowRequestProfiler(threshold_ms / 1000, interval_ms / 1000)
+        self.profiler = self._profiler
+        self.profiler.threshold = threshold_ms / 1000
+        self.profiler.interval = interval_ms / 1000
+        return self.profiler
+
+    def disable_profiler(self):
+        # The sampler thread stays, idle, for a later enable_profiler()
+        self.profiler = None
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def timer(self, name, **labels):
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, _key(name, labels))
+
+    def request(self, name, **labels):
+        # timer() for a whole request, sampled by the profiler when it is on
+        if not self.enabled:
+            return _NULL_TIMER
+        if self.profiler is None:
+            return _Timer(self, _key(name, labels))
+        return self._profiled(name, labels)
+
+    @contextmanager
+    def _profiled(self, name, labels):
+        with self.profiler.track(_series(name, sorted(labels.items()))), self.timer(name, **labels):
+            yield
+
+    def observe(self, name, seconds, **labels):
+        if self.enabled:
+            self._observe(_key(name, labels), seconds)
+
+    def _observe(self, key, seconds):
+        with self._lock:
+            self.histograms[key].observe(seconds)
+
+    def count(self, name, n=1, **labels):
+        if self.enabled:
+            with self._lock:
+                self.counters[_key(name, labels)] += n
+
+    def latest(self):
+        # Most recent observation per timer series, seconds
+        with self._lock:
+            return {_series(name, labels): h.latest
+                    for (name, labels), h in sorted(self.histograms.items())}
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "counters": {_series(name, labels): value
+                             for (name, labels), value in sorted(self.counters.items())},
+                "histograms": {_series(name, labels): {
+                    "count": h.count, "sum": h.sum, "mean": h.sum / h.count if h.count else 0.0,
+                    "max": h.max, "latest": h.latest,
+                    "buckets": dict(zip([str(b) for b in BUCKETS] + ["+Inf"], h.buckets)),
+                } for (name, labels), h in sorted(self.histograms.items())},
+            }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self):
+        lines = []
+        with self._lock:
+            typed = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} counter")
+                    typed.add(name)
+                lines.append(f"{_series(name, labels)} {value}")
+            for (name, labels), h in sorted(self.histograms.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} histogram")
+                    typed.add(name)
+                cumulative = 0
+                for bound, n in zip([str(b) for b in BUCKETS] + ["+Inf"], h.buckets):
+                    cumulative += n
+                    lines.append(f"{_series(name + '_bucket', labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{_series(name + '_sum', labels)} {h.sum}")
+                lines.append(f"{_series(name + '_count', labels)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
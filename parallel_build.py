@@ -0,0 +1,109 @@
+import multiprocessing as mp
+import os
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import CountVectorizer, TfidfTransformer, TfidfVectorizer
+
+# Multi-process pieces of the engine build: tokenization over sharded
+# vocabularies that are merged afterwards, and numpy arrays placed in shared
+# memory so pool workers attach to them instead of receiving pickled copies.
+
+
+def resolve_jobs(n_jobs):
+    # sklearn convention: -1 means every core
+    if n_jobs is None or n_jobs < 0:
+        return os.cpu_count() or 1
+    return max(1, n_jobs)
+
+
+def _count_chunk(job):
+    texts, dtype = job
+    counter = CountVectorizer(stop_words='english', dtype=dtype)
+    try:
+        counts = counter.fit_transform(texts)
+    except ValueError:
+        # Only stop words in this shard; other shards may still have terms
+        return np.empty(0, dtype=object), sp.csr_matrix((len(texts), 0), dtype=dtype)
+    return counter.get_feature_names_out(), counts
+
+
+def fit_tfidf(texts, dtype, n_jobs=1, timings=None):
+    # Same vocabulary, idf and rows as TfidfVectorizer(stop_words='english')
+    # .fit_transform(texts), with tokenization spread over n_jobs processes
+    timings = {} if timings is None else timings
+    start = time.perf_counter()
+    n_chunks = 1 if n_jobs == 1 else n_jobs * 4
+    step = -(-len(texts) // n_chunks) or 1
+    jobs = [(texts[i:i + step], dtype) for i in range(0, len(texts), step)]
+    if n_jobs > 1:
+        with mp.Pool(n_jobs) as pool:
+            parts = pool.map(_count_chunk, jobs)
+    else:
+        parts = [_count_chunk(job) for job in jobs]
+    timings['tokenize'] = time.perf_counter() - start
+
+    # Shard vocabularies are sorted, so remapping keeps row indices sorted
+    start = time.perf_counter()
+    vocab = np.unique(np.concatenate([terms for terms, _ in parts] or [np.empty(0, dtype=object)]))
+    if len(vocab) == 0:
+        raise ValueError("empty vocabulary; perhaps the documents only contain stop words")
+    blocks = []
+    for terms, counts in parts:
+        columns = np.searchsorted(vocab, terms).astype(np.int32)
+        blocks.append(sp.csr_matrix((counts.data, columns[counts.indices], counts.indptr),
+                                    shape=(counts.shape[0], len(vocab))))
+    counts = sp.vstack(blocks, format='csr')
+    timings['merge vocabularies'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    transformer = TfidfTransformer()
+    tfidf = transformer.fit_transform(counts)
+    # CountVectorizer orders a row's columns by first appearance in its shard;
+    # sorting makes scores bit-identical whatever the number of shards
+    tfidf.sort_indices()
+    vectorizer = TfidfVectorizer(stop_words='english', dtype=dtype,
+                                 vocabulary={t: i for i, t in enumerate(vocab.tolist())})
+    vectorizer.idf_ = transformer.idf_
+    timings['idf'] = time.perf_counter() - start
+    return vectorizer, tfidf
+
+
+class SharedArrays:
+    # Owner side: copies arrays into named shared-memory blocks. spec() is a
+    # small picklable description that workers hand to attach().
+
+    def __init__(self):
+        self.arrays = {}
+        self._blocks = {}
+
+    def add(self, name, arr):
+        arr = np.asarray(arr)
+        block = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+        shared = np.ndarray(arr.shape, dtype=arr.dtype, buffer=block.buf)
+        shared[...] = arr
+        self._blocks[name] = block
+        self.arrays[name] = shared
+
+    def spec(self):
+        return {name: (self._blocks[name].name, arr.shape, arr.dtype.str)
+                for name, arr in self.arrays.items()}
+
+    def close(self):
+        # Views must go before their buffers can be released
+        self.arrays.clear()
+        for block in self._blocks.values():
+            block.close()
+            block.unlink()
+        self._blocks.clear()
+
+
+def attach(spec):
+    # Worker side: (arrays, blocks); keep blocks referenced while arrays are used
+    blocks = {name: shared_memory.SharedMemory(name=shm_name)
+              for name, (shm_name, _, _) in spec.items()}
+    arrays = {name: np.ndarray(shape, dtype=dtype, buffer=blocks[name].buf)
+              for name, (_, shape, dtype) in spec.items()}
+    return arrays, blocks
@@ -0,0 +1,43 @@
+import numpy as np
+
+# Storage dtypes for similarity scores. int8 keeps one float32 scale per
+# row (row max / 127), so every row uses the full 0..127 range.
+STORAGE_DTYPES = ("float64", "float32", "float16", "int8")
+
+
+def check_dtype(dtype):
+    if dtype not in STORAGE_DTYPES:
+        raise ValueError(f"unknown storage dtype {dtype!r}, expected one of {STORAGE_DTYPES}")
+    return dtype
+
+
+def tfidf_dtype(dtype):
+    # Sparse kernels only exist for float32/float64, so narrower score
+    # storage still keeps a float32 TF-IDF matrix
+    return np.float64 if dtype == "float64" else np.float32
+
+
+def empty_scores(shape, dtype):
+    values = np.zeros(shape, dtype=dtype)
+    scales = np.ones(shape[0], dtype=np.float32) if dtype == "int8" else None
+    return values, scales
+
+
+def quantize_rows(scores, dtype, ignore=None):
+    # ignore: (rows, cols) positions left out of the int8 scale (they clip),
+    # e.g. the 1.0 self-similarity diagonal that would waste most of the range
+    if dtype != "int8":
+        return scores.astype(dtype), None
+    finite = np.where(np.isfinite(scores), scores, 0)
+    if ignore is not None:
+        finite[ignore] = 0
+    peak = np.abs(finite).max(axis=1, initial=0)
+    scales = np.where(peak > 0, peak / 127, 1).astype(np.float32)
+    values = np.clip(np.rint(scores / scales[:, np.newaxis]), -127, 127).astype(np.int8)
+    return values, scales
+
+
+def dequantize(values, scales):
+    if scales is None:
+        return values
+    return values.astype(np.float32) * scales.reshape(-1, *([1] * (values.ndim - 1)))
@@ -0,0 +1,149 @@
+import numpy as np
+
+# Second ranking stage. Similarity retrieval supplies each query's top
+# `candidates` neighbours; the reranker re-scores only those with a
+# weighted sum of per-product features read from precomputed arrays, and
+# can diversify the picks (MMR, a per-brand cap). The cost depends on the
+# candidate count, not on the size of the category.
+#
+#   r = Reranker({"similarity": 1, "rating": 0.3, "price": 0.1}, diversity=0.3)
+#   engine.get_similar_products(row, top_n=5, rerank=r)
+#
+# Results keep their similarity score; only their order changes.
+
+FEATURES = ("similarity", "rating", "price", "popularity")
+DEFAULT_WEIGHTS = {"similarity": 1.0, "rating": 0.2, "price": 0.05, "popularity": 0.05}
+# Unrated products count as this many stars
+NEUTRAL_RATING = 3.0
+
+
+def rank_features(data):
+    # Per-row features in [0, 1]. Price and popularity are relative to the
+    # product's category, so they do not change with the rest of the catalog
+    # (a shard ranks exactly like the whole engine):
+    #   rating      overall_rating / 5
+    #   price       1 - price percentile in the category: cheaper is higher
+    #   popularity  a popularity column when the catalog has one, otherwise
+    #               how many of the category's products share the brand;
+    #               log-scaled against the category's maximum
+    category = data["category"]
+    rating = data["overall_rating"].to_numpy(dtype=np.float64)
+    price = data["discounted_price"].groupby(category, observed=True).rank(pct=True)
+    if "popularity" in data.columns:
+        counts = data["popularity"].astype(np.float64).clip(lower=0)
+    else:
+        counts = data.groupby([category, data["brand"]], observed=True)["product_id"].transform("size")
+    counts = np.log1p(counts.astype(np.float64).fillna(0))
+    top = counts.groupby(category, observed=True).transform("max")
+    return {
+        "rating":     np.where(np.isnan(rating), NEUTRAL_RATING, rating) / 5,
+        "price":      (1 - price).fillna(0.5).to_numpy(dtype=np.float64),
+        "popularity": (counts / top.where(top > 0)).fillna(0).to_numpy(dtype=np.float64),
+        "brand":      data["brand"].cat.codes.to_numpy(dtype=np.int32),
+    }
+
+
+class Reranker:
+    # weights: feature -> weight (missing features weigh 0). diversity in
+    # [0, 1) trades relevance for dissimilarity to the products already
+    # picked (MMR); max_per_brand caps each brand, refilling from capped
+    # candidates only when the list would otherwise come up short.
+
+    def __init__(self, weights=None, candidates=50, diversity=0.0, max_per_brand=None):
+        weights = dict(DEFAULT_WEIGHTS if weights is None else weights)
+        unknown = set(weights) - set(FEATURES)
+        if unknown:
+            raise ValueError(f"unknown feature {sorted(unknown)[0]!r}, expected one of {list(FEATURES)}")
+        if not 0 <= diversity < 1:
+            raise ValueError(f"diversity must be in [0, 1), got {diversity}")
+        if candidates < 1 or (max_per_brand is not None and max_per_brand < 1):
+            raise ValueError("candidates and max_per_brand must be positive")
+        self.weights = {name: float(w) for name, w in weights.items() if w}
+        self.candidates = int(candidates)
+        self.diversity = float(diversity)
+        self.max_per_brand = None if max_per_brand is None else int(max_per_brand)
+        # Canonical and hashable, for result-cache keys
+        self.key = (tuple(sorted(self.weights.items())), self.candidates, self.diversity,
+                    self.max_per_brand)
+
+    def __eq__(self, other):
+        return isinstance(other, Reranker) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return (f"Reranker({self.weights}, candidates={self.candidates}, "
+                f"diversity={self.diversity}, max_per_brand={self.max_per_brand})")
+
+    @classmethod
+    def from_params(cls, params):
+        # From query-string / JSON style parameters: candidates, diversity,
+        # max_per_brand and weight_<feature>; every one is optional
+        weights = dict(DEFAULT_WEIGHTS)
+        kwargs = {}
+        for name, value in params.items():
+            if value is None or value == "":
+                continue
+            if name.startswith("weight_") and name[len("weight_"):] in FEATURES:
+                weights[name[len("weight_"):]] = float(value)
+            elif name == "diversity":
+                kwargs[name] = float(value)
+            elif name in ("candidates", "max_per_brand"):
+                kwargs[name] = int(value)
+            else:
+                raise ValueError(f"unknown rerank parameter {name!r}")
+        return cls(weights, **kwargs)
+
+    def rank(self, nbr_idx, nbr_scores, top_n, features, pairwise=None):
+        # nbr_idx / nbr_scores: (n, C) similarity candidates padded with -1;
+        # returns the top_n of each row the same way, in re-ranked order.
+        # pairwise(rows) gives the similarity matrix between rows (for MMR).
+        valid = nbr_idx >= 0
+        rows = np.maximum(nbr_idx, 0)
+        relevance = self.weights.get("similarity", 0.0) * nbr_scores.astype(np.float64)
+        for name, weight in self.weights.items():
+            if name != "similarity":
+                relevance += weight * features[name][rows]
+        relevance[~valid] = -np.inf
+
+        if not self.diversity and self.max_per_brand is None:
+            # Stable: equal relevance keeps the similarity order
+            order = np.argsort(-relevance, axis=1, kind="stable")[:, :top_n]
+            picks = [row[np.isfinite(rel[row])] for row, rel in zip(order, relevance)]
+        else:
+            picks = [self._diversify(nbr_idx[i], relevance[i], top_n, features["brand"], pairwise)
+                     for i in range(len(nbr_idx))]
+
+        out_idx = np.full((len(nbr_idx), top_n), -1, dtype=np.int32)
+        out_scores = np.zeros((len(nbr_idx), top_n), dtype=np.float32)
+        for i, cols in enumerate(picks):
+            out_idx[i, :len(cols)] = nbr_idx[i, cols]
+            out_scores[i, :len(cols)] = nbr_scores[i, cols]
+        return out_idx, out_scores
+
+    def _diversify(self, cands, relevance, top_n, brands, pairwise):
+        # Greedy MMR over one query's candidates, brand cap applied on the way
+        live = np.flatnonzero(np.isfinite(relevance))
+        if not len(live):
+            return live
+        relevance = relevance[live]
+        similar = pairwise(cands[live]) if self.diversity and pairwise is not None else None
+        penalty = np.zeros(len(live))
+        open_ = np.ones(len(live), dtype=bool)
+        picks, capped, per_brand = [], [], {}
+        while len(picks) < top_n and open_.any():
+            gain = (1 - self.diversity) * relevance - self.diversity * penalty
+            j = int(np.argmax(np.where(open_, gain, -np.inf)))
+            open_[j] = False
+            brand = brands[cands[live[j]]]
+            if self.max_per_brand is not None and brand >= 0:
+                if per_brand.get(brand, 0) >= self.max_per_brand:
+                    capped.append(j)
+                    continue
+                per_brand[brand] = per_brand.get(brand, 0) + 1
+            picks.append(j)
+            if similar is not None:
+                penalty = np.maximum(penalty, similar[j])
+        picks += capped[:top_n - len(picks)]
+        return live[picks]
@@ -0,0 +1,57 @@
+import threading
+import time
+from collections import Counter, OrderedDict
+
+
+class ResultCache:
+    # Bounded LRU with an optional TTL, shared by every session using the
+    # engine. Entries are tagged with the catalog version they were computed
+    # against; a lookup under a newer version is a miss and drops the entry.
+    # Values must be immutable, since every caller gets the same object.
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = Counter(hits=0, misses=0, evictions=0, expired=0, stale=0)
+
+    def get(self, key, version):
+        # (True, value) on a hit, (False, None) otherwise
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, entry_version, expires = entry
+                if entry_version != version:
+                    self.counters["stale"] += 1
+                    del self._entries[key]
+                elif expires is not None and expires <= time.monotonic():
+                    self.counters["expired"] += 1
+                    del self._entries[key]
+                else:
+                    self._entries.move_to_end(key)
+                    self.counters["hits"] += 1
+                    return True, value
+            self.counters["misses"] += 1
+            return False, None
+
+    def put(self, key, version, value):
+        if self.maxsize <= 0:
+            return
+        expires = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            self._entries[key] = (value, version, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.counters["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return dict(self.counters, size=len(self._entries), maxsize=self.maxsize,
+                        hit_rate=self.counters["hits"] / lookups if lookups else 0.0)
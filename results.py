@@ -0,0 +1,138 @@
+from collections.abc import Mapping
+
+import numpy as np
+
+# Compact recommendation results. The engine keeps the catalog fields a
+# result shows as plain arrays (result_columns), and a result set gathers
+# all of its rows from them with one vectorized take per field: no pandas
+# Series per neighbour and no dict per result. Recommendations reads like
+# the tuple of read-only mappings it replaces (len, iteration, r["name"],
+# r.get("brand"), dict(r)); to_dicts() gives plain dicts.
+
+FIELDS = ("row", "product_id", "name", "image", "brand", "price", "retail_price", "rating",
+          "score", "category", "category_label", "description")
+# Result field -> catalog column
+COLUMNS = {
+    "product_id":     "product_id",
+    "name":           "product_name",
+    "image":          "image",
+    "brand":          "brand",
+    "price":          "discounted_price",
+    "retail_price":   "retail_price",
+    "rating":         "overall_rating",
+    "category":       "category",
+    "category_label": "category_label",
+    "description":    "description",
+}
+
+
+def result_columns(data):
+    # One array per field, aligned with the catalog rows
+    columns = {}
+    for field, column in COLUMNS.items():
+        if field == "description":
+            # Kept as Arrow strings (zero-copy over a mapped catalog): only
+            # the rows a result shows become Python strings
+            import pyarrow as pa
+            columns[field] = (pa.Table.from_pandas(data[[column]], preserve_index=False).column(0)
+                              if column in data.columns else np.full(len(data), "", dtype=object))
+        elif column not in data.columns:
+            columns[field] = np.full(len(data), None, dtype=object)
+        elif data[column].dtype.kind == "f":
+            # The catalog's own float type: float32 prices and ratings print
+            # as 4.8, not as the 4.800000190734863 a float64 copy would give
+            columns[field] = data[column].to_numpy()
+        else:
+            columns[field] = data[column].to_numpy(dtype=object)
+    return columns
+
+
+def _take(values, rows):
+    if isinstance(values, np.ndarray):
+        return values[rows]
+    # Arrow text, one scalar per row (cheaper than a take for a result's
+    # handful of rows): missing becomes "", surrounding whitespace goes
+    text = (values[row].as_py() for row in rows.tolist())
+    return np.array(["" if s is None else s.strip() for s in text], dtype=object)
+
+
+class Recommendations:
+    # rows and scores in rank order, plus each field gathered for those rows.
+    # A cached result set is shared by every caller, so all of its arrays
+    # are read-only.
+
+    __slots__ = ("rows", "scores", "fields")
+
+    def __init__(self, rows, scores, columns):
+        self.rows = np.array(rows, dtype=np.int64)
+        self.scores = np.round(np.asarray(scores, dtype=np.float64), 3)
+        self.fields = {field: _take(values, self.rows) for field, values in columns.items()}
+        for values in (self.rows, self.scores, *self.fields.values()):
+            values.flags.writeable = False
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            # The sliced results, as a result set of their own (views of
+            # these arrays, so read-only as well)
+            sliced = Recommendations.__new__(Recommendations)
+            sliced.rows = self.rows[i]
+            sliced.scores = self.scores[i]
+            sliced.fields = {field: values[i] for field, values in self.fields.items()}
+            return sliced
+        return Recommendation(self, range(len(self.rows))[i])
+
+    def __iter__(self):
+        return (Recommendation(self, i) for i in range(len(self.rows)))
+
+    def __eq__(self, other):
+        return (isinstance(other, Recommendations) and np.array_equal(self.rows, other.rows)
+                and np.array_equal(self.scores, other.scores))
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Recommendations({list(zip(self.rows.tolist(), self.scores.tolist()))})"
+
+    def column(self, field):
+        # All values of one field, as an array in rank order
+        if field == "row":
+            return self.rows
+        if field == "score":
+            return self.scores
+        return self.fields[field]
+
+    def to_dicts(self):
+        # The plain list-of-dicts form, one dict per result. Narrow floats
+        # stay numpy scalars (tolist() would widen float32 to float64)
+        values = [list(column) if column.dtype.kind == "f" and column.dtype.itemsize < 8
+                  else column.tolist() for column in map(self.column, FIELDS)]
+        return [dict(zip(FIELDS, row)) for row in zip(*values)]
+
+
+class Recommendation(Mapping):
+    # One result: a read-only view of position i in its Recommendations
+
+    __slots__ = ("results", "i")
+
+    def __init__(self, results, i):
+        self.results = results
+        self.i = i
+
+    def __getitem__(self, field):
+        if field == "row":
+            return int(self.results.rows[self.i])
+        if field == "score":
+            return float(self.results.scores[self.i])
+        return self.results.fields[field][self.i]
+
+    def __iter__(self):
+        return iter(FIELDS)
+
+    def __len__(self):
+        return len(FIELDS)
+
+    def __repr__(self):
+        return f"Recommendation({dict(self)!r})"
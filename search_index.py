@@ -0,0 +1,89 @@
+import re
+
+import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer
+
+TOKEN = r"\w+"
+
+
+class NameSearchIndex:
+    # Token inverted index over product names. Every query token matches
+    # as a prefix of a name token (type-ahead), and a row must match all
+    # query tokens. Ranking: more whole-token matches first, then shorter
+    # names, then lower row id.
+
+    def __init__(self, names, group_codes=None):
+        names = names.fillna("").astype(str)
+        vectorizer = CountVectorizer(token_pattern=TOKEN, binary=True, dtype=np.int8)
+        postings = vectorizer.fit_transform(names).tocsc()
+
+        # Sorted vocabulary, so a prefix is a contiguous range of token ids
+        self.vocab = vectorizer.get_feature_names_out()
+        self.indptr = postings.indptr
+        self.postings = postings.indices.astype(np.int32)
+
+        self.name_lengths = names.str.len().to_numpy(np.int64)
+        self.length_base = int(self.name_lengths.max(initial=0)) + 1
+        self.group_codes = group_codes
+        self.n_rows = len(names)
+
+    def _range(self, token, prefix=True):
+        lo = np.searchsorted(self.vocab, token, side="left")
+        if prefix:
+            hi = np.searchsorted(self.vocab, token + "\uffff", side="left")
+        else:
+            hi = lo + int(lo < len(self.vocab) and self.vocab[lo] == token)
+        return lo, hi
+
+    def _rows(self, lo, hi):
+        rows = self.postings[self.indptr[lo]:self.indptr[hi]]
+        if hi - lo > 1:
+            mask = np.zeros(self.n_rows, dtype=bool)
+            mask[rows] = True
+            rows = np.flatnonzero(mask).astype(np.int32)
+        return rows
+
+    def _contains(self, rows, lo, hi):
+        # Which of rows appear in the postings of token ids [lo, hi)
+        if hi - lo == 1:
+            posting = self.postings[self.indptr[lo]:self.indptr[hi]]
+            pos = np.minimum(np.searchsorted(posting, rows), len(posting) - 1)
+            return posting[pos] == rows
+        if hi == lo:
+            return np.zeros(len(rows), dtype=bool)
+        mask = np.zeros(self.n_rows, dtype=bool)
+        mask[self.postings[self.indptr[lo]:self.indptr[hi]]] = True
+        return mask[rows]
+
+    def search(self, query, group=None, exclude=None, limit=20, offset=0):
+        # Returns (page of row ids, total number of matches)
+        tokens = list(dict.fromkeys(re.findall(TOKEN, query.lower())))
+        if tokens:
+            # Start from the most selective token, then filter by the others
+            ranges = sorted((self._range(t) for t in tokens),
+                            key=lambda r: self.indptr[r[1]] - self.indptr[r[0]])
+            rows = self._rows(*ranges[0])
+            for lo, hi in ranges[1:]:
+                rows = rows[self._contains(rows, lo, hi)]
+        else:
+            rows = np.arange(self.n_rows, dtype=np.int32)
+        if group is not None:
+            rows = rows[self.group_codes[rows] == group]
+        if exclude is not None:
+            rows = rows[~exclude[rows]]
+
+        total = len(rows)
+        want = min(offset + limit, total)
+        if want <= offset or not tokens:
+            # No query: plain catalog order
+            return rows[offset:want], total
+
+        misses = np.full(total, len(tokens), dtype=np.int64)
+        for t in tokens:
+            misses -= self._contains(rows, *self._range(t, prefix=False))
+        # Row id folded into the key keeps it unique, so the page is deterministic
+        key = misses * self.length_base + self.name_lengths[rows]
+        key = key * self.n_rows + rows
+        top = np.argpartition(key, want - 1)[:want] if want < total else np.arange(total)
+        top = top[np.argsort(key[top])]
+        return rows[top[offset:]], total
@@ -0,0 +1,381 @@
+import argparse
+import asyncio
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from catalog import default_catalog_path
+from filters import Filter
+from metrics import METRICS
+from rerank import Reranker
+from sharding import ShardedEngine
+from similarity_engine import SimilarityEngine
+
+# Async HTTP/JSON recommendation service next to the Streamlit UI. One
+# engine load serves every connection: scoring runs in a thread or process
+# pool, and single lookups that arrive together are micro-batched into one
+# get_similar_products_batch call.
+#
+#   GET  /similar?id=<product_id>&top_n=5[&min_price=&max_price=&min_rating=
+#                 &brand=&exclude_brand=&in_stock=1]   brand params repeat
+#                 [&rerank=1&diversity=&max_per_brand=&candidates=&weight_<feature>=]
+#   POST /similar/batch        {"ids": [...], "top_n": 5, "filters": {...},
+#                               "rerank": true or {"diversity": 0.3, ...}}
+#   GET  /healthz              the process is up
+#   GET  /readyz               engine loaded (503 until then)
+#   GET  /metrics              Prometheus text (?format=json for JSON); --metrics
+#
+# With --shards (sharding.py) the engine is a router over per-shard worker
+# processes; pool threads then only wait on the shards.
+
+MAX_TOP_N = 100
+MAX_BATCH_IDS = 1000
+RESULT_COLUMNS = {
+    "product_id": "product_id",
+    "name":       "product_name",
+    "brand":      "brand",
+    "price":      "discounted_price",
+    "rating":     "overall_rating",
+    "category":   "category_label",
+}
+RERANK_PARAMS = ("candidates", "diversity", "max_per_brand")
+ROUTES = ("/similar", "/similar/batch", "/healthz", "/readyz", "/metrics")
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _json_column(series):
+    # Plain Python values, None for missing, so json.dumps takes them as is
+    if series.dtype.kind == "f":
+        return [None if v != v else v for v in series.to_numpy(dtype=float).round(2).tolist()]
+    return series.astype(object).where(series.notna(), None).tolist()
+
+
+def recommend(engine, rows, top_n, filters=None, rerank=None):
+    # One list of neighbour dicts per entry of rows (unique, ascending).
+    # Runs on a pool thread, so this is what the slow-request profiler samples.
+    with METRICS.request("recommend_seconds"):
+        result = engine.get_similar_products_batch(rows, top_n, filters, rerank)
+        neighbors = engine.data.iloc[result["neighbor"]]
+        columns = {key: _json_column(neighbors[col]) for key, col in RESULT_COLUMNS.items()}
+        columns["score"] = result["score"].astype(float).round(4).tolist()
+        columns["rank"] = result["rank"].tolist()
+
+        counts = np.bincount(np.searchsorted(rows, result["query"]), minlength=len(rows))
+        out, start = [], 0
+        for count in counts.tolist():
+            out.append([{key: values[i] for key, values in columns.items()}
+                        for i in range(start, start + count)])
+            start += count
+        return out
+
+
+# Process-pool workers memory-map their own copy of the artifacts
+_engine = None
+
+
+def _init_worker(artifacts):
+    global _engine
+    _engine = SimilarityEngine.load(artifacts)
+
+
+def _recommend_in_worker(rows, top_n, filters, rerank):
+    return recommend(_engine, rows, top_n, filters, rerank)
+
+
+def _ping():
+    return os.getpid()
+
+
+class MicroBatcher:
+    # Single lookups for the same top_n, filters and reranker that arrive within window
+    # seconds (or until max_batch of them queue up) share one scoring call
+
+    def __init__(self, run_batch, window, max_batch):
+        self.run_batch = run_batch
+        self.window = window
+        self.max_batch = max_batch
+        self.pending = {}
+
+    async def submit(self, row, top_n, filters=None, rerank=None):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        key = (top_n, filters, rerank)
+        queue = self.pending.setdefault(key, [])
+        queue.append((row, future))
+        if len(queue) >= self.max_batch:
+            self._flush(key)
+        elif len(queue) == 1:
+            loop.call_later(self.window, self._flush, key)
+        return await future
+
+    def _flush(self, key):
+        queue = self.pending.pop(key, None)
+        if queue:
+            asyncio.ensure_future(self._run(key, queue))
+
+    async def _run(self, key, queue):
+        try:
+            results = await self.run_batch([row for row, _ in queue], *key)
+        except Exception as exc:
+            for _, future in queue:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for (_, future), result in zip(queue, results):
+            if not future.done():
+                future.set_result(result)
+
+
+class RecommendationServer:
+    def __init__(self, artifacts, catalog, executor="thread", workers=4,
+                 batch_window_ms=2.0, max_batch=64, shards=None, replicas=1):
+        if executor == "process" and not shards and not os.path.exists(os.path.join(artifacts, "manifest.json")):
+            raise SystemExit("--executor process needs prebuilt artifacts (python build_index.py)")
+        self.artifacts = artifacts
+        self.catalog = catalog
+        self.executor = executor
+        self.workers = workers
+        self.shards = shards
+        self.replicas = replicas
+        self.engine = None
+        self.n_products = 0
+        self.ready = False
+        self.batcher = MicroBatcher(self.run_batch, batch_window_ms / 1000, max_batch)
+
+    def _load_engine(self):
+        if self.shards:
+            return ShardedEngine(self.shards, replicas=self.replicas)
+        if os.path.exists(os.path.join(self.artifacts, "manifest.json")):
+            return SimilarityEngine.load(self.artifacts)
+        return SimilarityEngine(self.catalog, mode="topk")
+
+    async def load(self):
+        # Runs in the background so /healthz answers while the model loads
+        loop = asyncio.get_running_loop()
+        self.engine = await loop.run_in_executor(None, self._load_engine)
+        self.n_products = self.engine.n_products if self.shards else len(self.engine.data)
+        if self.shards:
+            self.pool = ThreadPoolExecutor(self.workers)
+            self.score = partial(self.engine.per_row, recommend)
+        elif self.executor == "process":
+            self.pool = ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                            initargs=(self.artifacts,))
+            self.score = _recommend_in_worker
+            # Start every worker (and its engine load) before reporting ready
+            await asyncio.gather(*(loop.run_in_executor(self.pool, _ping)
+                                   for _ in range(self.workers)))
+        else:
+            self.pool = ThreadPoolExecutor(self.workers)
+            self.score = partial(recommend, self.engine)
+        self.ready = True
+
+    async def run_batch(self, rows, top_n, filters=None, rerank=None):
+        # Duplicate rows are scored once
+        unique, inverse = np.unique(np.asarray(rows, dtype=np.int32), return_inverse=True)
+        loop = asyncio.get_running_loop()
+        results = await loop.run_in_executor(self.pool, self.score, unique, top_n, filters, rerank)
+        return [results[i] for i in inverse.tolist()]
+
+    def _top_n(self, value):
+        try:
+            top_n = int(value)
+        except (TypeError, ValueError):
+            raise HTTPError(400, "top_n must be an integer")
+        if not 1 <= top_n <= MAX_TOP_N:
+            raise HTTPError(400, f"top_n must be between 1 and {MAX_TOP_N}")
+        return top_n
+
+    def _filters(self, params):
+        try:
+            return Filter.from_params(params)
+        except (TypeError, ValueError) as exc:
+            raise HTTPError(400, f"bad filter: {exc}")
+
+    def _rerank(self, params):
+        try:
+            return Reranker.from_params(params)
+        except (TypeError, ValueError) as exc:
+            raise HTTPError(400, f"bad rerank: {exc}")
+
+    async def route(self, method, target, body):
+        url = urlsplit(target)
+        if url.path == "/healthz":
+            return 200, {"status": "ok"}
+        if url.path == "/readyz":
+            if self.ready:
+                return 200, {"status": "ready", "products": self.n_products}
+            return 503, {"status": "loading"}
+        if url.path == "/metrics":
+            if parse_qs(url.query).get("format") == ["json"]:
+                snapshot = METRICS.snapshot()
+                if self.ready and not self.shards:
+                    snapshot["result_cache"] = self.engine.result_cache.stats()
+                return 200, snapshot
+            return 200, METRICS.to_prometheus()
+
+        if url.path not in ("/similar", "/similar/batch"):
+            raise HTTPError(404, f"no route for {url.path}")
+        if not self.ready:
+            raise HTTPError(503, "engine is still loading")
+
+        if url.path == "/similar":
+            if method != "GET":
+                raise HTTPError(405, "use GET")
+            query = parse_qs(url.query)
+            product_id = query.get("id", [None])[0]
+            if product_id is None:
+                raise HTTPError(400, "missing id")
+            top_n = self._top_n(query.get("top_n", [5])[0])
+            params = {name: values if name in ("brand", "exclude_brand") else values[-1]
+                      for name, values in query.items() if name not in ("id", "top_n")}
+            rerank = None
+            if params.pop("rerank", "0").lower() in ("1", "true", "yes"):
+                rerank = self._rerank({name: params.pop(name) for name in list(params)
+                                       if name in RERANK_PARAMS or name.startswith("weight_")})
+            filters = self._filters(params)
+            row = self.engine.rows_for_ids([product_id])[0]
+            if row < 0:
+                raise HTTPError(404, f"unknown product id {product_id!r}")
+            results = await self.batcher.submit(int(row), top_n, filters or None, rerank)
+            return 200, {"product_id": product_id, "top_n": top_n, "results": results}
+
+        if method != "POST":
+            raise HTTPError(405, "use POST")
+        try:
+            request = json.loads(body or b"{}")
+            if not isinstance(request["ids"], list):
+                raise TypeError("ids must be a list")
+            ids = [str(i) for i in request["ids"]]
+        except (ValueError, KeyError, TypeError):
+            raise HTTPError(400, 'body must be JSON like {"ids": [...], "top_n": 5}')
+        if len(ids) > MAX_BATCH_IDS:
+            raise HTTPError(400, f"at most {MAX_BATCH_IDS} ids per batch")
+        top_n = self._top_n(request.get("top_n", 5))
+        filters = request.get("filters") or {}
+        if not isinstance(filters, dict):
+            raise HTTPError(400, "filters must be a JSON object")
+        filters = self._filters(filters) or None
+        rerank = request.get("rerank") or None
+        if rerank is True:
+            rerank = Reranker()
+        elif rerank is not None:
+            if not isinstance(rerank, dict):
+                raise HTTPError(400, "rerank must be true or a JSON object")
+            rerank = self._rerank(rerank)
+        rows = self.engine.rows_for_ids(ids)
+        known = rows >= 0
+        scored = iter(await self.run_batch(rows[known], top_n, filters, rerank)) if known.any() else iter(())
+        return 200, {"top_n": top_n, "results": [
+            {"product_id": product_id, "results": next(scored)} if ok else
+            {"product_id": product_id, "error": "unknown product id"}
+            for product_id, ok in zip(ids, known.tolist())]}
+
+    async def handle(self, reader, writer):
+        # Minimal HTTP/1.1 with keep-alive: JSON in, JSON out
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                method, target, version = line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    header = await reader.readline()
+                    if header in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = header.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length") or 0))
+
+                path = urlsplit(target).path
+                path = path if path in ROUTES else "other"
+                with METRICS.timer("http_request_seconds", path=path):
+                    try:
+                        status, payload = await self.route(method, target, body)
+                    except HTTPError as exc:
+                        status, payload = exc.status, {"error": str(exc)}
+                    except Exception as exc:
+                        status, payload = 500, {"error": repr(exc)}
+                METRICS.count("http_requests_total", path=path, status=status)
+
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                if isinstance(payload, str):
+                    data, content_type = payload.encode(), "text/plain; version=0.0.4"
+                else:
+                    data, content_type = json.dumps(payload).encode(), "application/json"
+                writer.write((f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                              f"Content-Type: {content_type}\r\n"
+                              f"Content-Length: {len(data)}\r\n"
+                              f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode()
+                             + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(args):
+    if args.metrics:
+        METRICS.enable()
+    if args.profile_slow_ms:
+        METRICS.enable_profiler(args.profile_slow_ms).hooks.append(
+            lambda record: print(f"slow request {record['name']} {record['seconds'] * 1000:.0f} ms: "
+                                 f"{record['stacks'][0][0] if record['stacks'] else 'no samples'}"))
+    app = RecommendationServer(args.artifacts, args.catalog, args.executor, args.workers,
+                               args.batch_window_ms, args.max_batch, args.shards, args.replicas)
+    server = await asyncio.start_server(app.handle, args.host, args.port, backlog=1024)
+    print(f"✔ listening on http://{args.host}:{args.port} (loading engine…)")
+    loading = asyncio.create_task(app.load())
+    async with server:
+        await loading
+        if args.shards:
+            print(f"✔ ready: {app.n_products:,} products in {len(app.engine.pools)} shards, "
+                  f"{args.replicas} process(es) each")
+        else:
+            print(f"✔ ready: {app.n_products:,} products, {args.workers} {args.executor} workers")
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP/JSON recommendation service")
+    parser.add_argument("--artifacts", default="data/engine",
+                        help="prebuilt engine (build_index.py); falls back to fitting --catalog")
+    parser.add_argument("--catalog", default=default_catalog_path())
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--shards", default=None,
+                        help="serve sharded artifacts (build_index.py --shards) instead of --artifacts")
+    parser.add_argument("--replicas", type=int, default=1, help="--shards: worker processes per shard")
+    parser.add_argument("--executor", choices=["thread", "process"], default="thread")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--batch-window-ms", type=float, default=2.0,
+                        help="how long a single lookup waits for others to batch with")
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--metrics", action="store_true",
+                        help="record timers/counters for /metrics (thread executor: process "
+                             "workers keep their own)")
+    parser.add_argument("--profile-slow-ms", type=float, default=0,
+                        help="sample stacks of requests slower than this and log them (0: off)")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+import copy
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from types import MappingProxyType
+
+import numpy as np
+import pandas as pd
+
+from catalog import load_catalog
+from metrics import METRICS
+from parallel_build import fit_tfidf, resolve_jobs
+from quantize import tfidf_dtype
+from similarity_engine import SimilarityEngine
+
+# Catalog partitioned by category across shard processes. A category never
+# spans shards (recommendations stay inside the query's category) and small
+# categories are bucketed together by size. Every shard is an ordinary
+# SimilarityEngine artifact directory, and all shards share one vocabulary
+# and idf, so a shard's neighbours are exactly the unsharded engine's.
+#
+# ShardedEngine is the router: it maps product ids to global rows (shard by
+# shard), sends each query to the worker processes of the shard that owns
+# it, and fans out / merges queries that span shards.
+#
+#   python build_index.py --shards 4 --out data/shards
+#   engine = ShardedEngine("data/shards")
+
+SHARDS_FORMAT_VERSION = 1
+
+
+def plan_shards(sizes, n_shards):
+    # Size-balanced bucketing: biggest group first, always into the shard
+    # with the fewest rows so far
+    assignment = np.empty(len(sizes), dtype=np.int32)
+    loads = np.zeros(n_shards, dtype=np.int64)
+    for group in np.argsort(-np.asarray(sizes), kind="stable"):
+        shard = int(np.argmin(loads))
+        assignment[group] = shard
+        loads[shard] += sizes[group]
+    return assignment
+
+
+def build_shards(catalog_path, out, n_shards, n_jobs=1, **engine_kwargs):
+    # engine_kwargs go to every shard's SimilarityEngine (mode, k, dtype, ...)
+    timings = {}
+    start = time.perf_counter()
+    data = load_catalog(catalog_path)
+    codes, categories = pd.factorize(data["category"])
+    timings["load catalog"] = time.perf_counter() - start
+
+    # One vocabulary/idf, fitted on the whole catalog, for every shard
+    vectorizer, _ = fit_tfidf(data["description"], tfidf_dtype(engine_kwargs.get("dtype", "float32")),
+                              resolve_jobs(n_jobs), timings)
+
+    # Rows without a category form one more group: they have no neighbours
+    # but stay addressable by id and reachable by query_text
+    groups = np.where(codes < 0, len(categories), codes)
+    sizes = np.bincount(groups, minlength=len(categories) + 1)
+    n_shards = max(1, min(n_shards, int((sizes > 0).sum())))
+    shard_of_group = plan_shards(sizes, n_shards)
+    shard_of_row = shard_of_group[groups]
+
+    os.makedirs(out, exist_ok=True)
+    shards, product_ids, labels = [], [], {}
+    for shard in range(n_shards):
+        start = time.perf_counter()
+        name = f"shard-{shard:02d}"
+        path = os.path.join(out, name)
+        os.makedirs(path, exist_ok=True)
+        catalog = os.path.join(path, "catalog.parquet")
+        data.iloc[np.flatnonzero(shard_of_row == shard)].to_parquet(catalog, index=False)
+        engine = SimilarityEngine(catalog, vectorizer=vectorizer, n_jobs=n_jobs, cache_size=0,
+                                  **copy.deepcopy(engine_kwargs))
+        engine.save(os.path.join(path, "engine"))
+
+        product_ids.append(engine.data["product_id"].to_numpy(dtype=object))
+        for label in engine.data["category_label"].dropna().unique().tolist():
+            labels.setdefault(label, []).append(shard)
+        shards.append({"path": name, "rows": len(engine.data), "categories": engine.categories})
+        timings[name] = time.perf_counter() - start
+
+    # Router table: product id per global row, shards in order
+    pd.DataFrame({"product_id": np.concatenate(product_ids)}).to_parquet(
+        os.path.join(out, "router.parquet"), index=False)
+    manifest = {
+        "format_version": SHARDS_FORMAT_VERSION,
+        "n_shards": n_shards,
+        "shards": shards,
+        "labels": labels,
+    }
+    # Manifest goes last: a directory without one is an unfinished build
+    with open(os.path.join(out, "shards.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest, timings
+
+
+# Shard worker processes: each memory-maps one shard's artifacts
+_shard = None
+
+
+def _init_shard(path):
+    global _shard
+    _shard = SimilarityEngine.load(path)
+
+
+def _shard_apply(fn, *args):
+    return fn(_shard, *args)
+
+
+def _similar(engine, row, top_n, filters, rerank):
+    return engine.get_similar_products(row, top_n, filters, rerank).to_dicts()
+
+
+def _batch(engine, rows, top_n, filters, rerank):
+    return engine.get_similar_products_batch(rows, top_n, filters, rerank)
+
+
+def _texts(engine, texts, category, top_n, filters):
+    # Raw scores next to the materialized rows, so the router merges shards
+    # on exact scores rather than the rounded ones in the results
+    ranked = engine._rank_texts(texts, top_n, category, filters)
+    return [[(score, r) for (_, score), r in zip(items, engine._materialize(items).to_dicts())]
+            for items in ranked]
+
+
+def _ping(engine):
+    return len(engine.data)
+
+
+class ShardedEngine:
+    # Router over the shard processes written by build_shards(). Rows are
+    # global (shard 0's rows first); results carry global rows too. Shards
+    # are read-only: catalog updates mean rebuilding them.
+
+    def __init__(self, path, replicas=1):
+        with open(os.path.join(path, "shards.json"), encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest["format_version"] != SHARDS_FORMAT_VERSION:
+            raise ValueError(f"shards at {path!r} are format v{manifest['format_version']}, "
+                             f"this router reads v{SHARDS_FORMAT_VERSION}; rebuild them")
+        self.manifest = manifest
+        self.product_ids = pd.read_parquet(os.path.join(path, "router.parquet"))["product_id"]
+        self.id_index = pd.Index(self.product_ids)
+        self.n_products = len(self.product_ids)
+
+        sizes = [shard["rows"] for shard in manifest["shards"]]
+        self.offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+        self.shard_of_category = {category: shard for shard, info in enumerate(manifest["shards"])
+                                  for category in info["categories"]}
+        # Each shard has replicas worker processes, all mapping the same files
+        self.pools = [ProcessPoolExecutor(replicas, initializer=_init_shard,
+                                          initargs=(os.path.join(path, info["path"], "engine"),))
+                      for info in manifest["shards"]]
+        # Start every worker (and its engine load) now rather than on the first query
+        for pool in self.pools:
+            for future in [pool.submit(_shard_apply, _ping) for _ in range(replicas)]:
+                future.result()
+
+    def close(self):
+        for pool in self.pools:
+            pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def rows_for_ids(self, product_ids):
+        # int32 global row per id, -1 where unknown
+        return self.id_index.get_indexer(pd.Index(product_ids, dtype=object)).astype(np.int32)
+
+    def _locate(self, rows):
+        shards = np.searchsorted(self.offsets, rows, side="right") - 1
+        return shards, rows - self.offsets[shards]
+
+    def _shards_for(self, category):
+        if category is None:
+            return list(range(len(self.pools)))
+        if category in self.shard_of_category:
+            return [self.shard_of_category[category]]
+        return self.manifest["labels"].get(category, [])
+
+    def _globalize(self, shard, results):
+        offset = int(self.offsets[shard])
+        return tuple(MappingProxyType(dict(r, row=r["row"] + offset)) for r in results)
+
+    def get_similar_products(self, row, top_n=5, filters=None, rerank=None):
+        with METRICS.timer("router_seconds", op="similar"):
+            shard, local = self._locate(np.int64(row))
+            results = self.pools[shard].submit(
+                _shard_apply, _similar, int(local), top_n, filters, rerank).result()
+            return self._globalize(shard, results)
+
+    def per_row(self, fn, rows, *args):
+        # fn(shard_engine, local_rows, *args) runs in every shard that owns
+        # some of rows, all shards at once; it must return one item per local
+        # row, and the items come back in the order of rows
+        rows = np.asarray(rows, dtype=np.int64)
+        shards, local = self._locate(rows)
+        futures = {shard: self.pools[shard].submit(
+                       _shard_apply, fn, local[shards == shard].astype(np.int32), *args)
+                   for shard in np.unique(shards).tolist()}
+        out = [None] * len(rows)
+        for shard, future in futures.items():
+            for position, item in zip(np.flatnonzero(shards == shard).tolist(), future.result()):
+                out[position] = item
+        return out
+
+    def get_similar_products_batch(self, rows, top_n=5, filters=None, rerank=None):
+        # Same columns as SimilarityEngine.get_similar_products_batch, global rows
+        with METRICS.timer("router_seconds", op="batch"):
+            rows = np.asarray(rows, dtype=np.int64)
+            shards, local = self._locate(rows)
+            futures = {shard: self.pools[shard].submit(
+                           _shard_apply, _batch, local[shards == shard].astype(np.int32), top_n, filters,
+                           rerank)
+                       for shard in np.unique(shards).tolist()}
+            parts, positions = [], []
+            for shard, future in futures.items():
+                result = future.result()
+                offset = self.offsets[shard]
+                # Each query with results is a run starting at rank 1, in input order
+                asked = np.flatnonzero(shards == shard)
+                answered = asked[np.isin(local[asked], result["query"])]
+                lengths = np.diff(np.append(np.flatnonzero(result["rank"] == 1), len(result["rank"])))
+                positions.append(np.repeat(answered, lengths))
+                parts.append({"query": result["query"] + offset, "rank": result["rank"],
+                              "neighbor": result["neighbor"] + offset, "score": result["score"]})
+            if not parts:
+                return {"query": np.empty(0, dtype=np.int64), "rank": np.empty(0, dtype=np.int16),
+                        "neighbor": np.empty(0, dtype=np.int64), "score": np.empty(0, dtype=np.float32)}
+            order = np.argsort(np.concatenate(positions), kind="stable")
+            return {name: np.concatenate([part[name] for part in parts])[order]
+                    for name in ("query", "rank", "neighbor", "score")}
+
+    def _query_texts(self, texts, category, top_n, filters):
+        # Every shard that can hold the category answers; the best top_n
+        # per text win (ties to the lower global row)
+        futures = {shard: self.pools[shard].submit(_shard_apply, _texts, texts, category, top_n, filters)
+                   for shard in self._shards_for(category)}
+        merged = [[] for _ in texts]
+        for shard, future in futures.items():
+            offset = int(self.offsets[shard])
+            for i, items in enumerate(future.result()):
+                merged[i].extend((score, r["row"] + offset, r) for score, r in items)
+        return [[MappingProxyType(dict(r, row=row))
+                 for _, row, r in sorted(items, key=lambda item: (-item[0], item[1]))[:top_n]]
+                for items in merged]
+
+    def query_text(self, text, category=None, top_n=5, filters=None):
+        with METRICS.timer("router_seconds", op="text"):
+            return tuple(self._query_texts([text], category, top_n, filters)[0])
+
+    def query_text_batch(self, texts, category=None, top_n=5, filters=None):
+        # Lists of results per text (not columnar: the router has no catalog)
+        with METRICS.timer("router_seconds", op="text_batch"):
+            return [tuple(results) for results in self._query_texts(list(texts), category, top_n, filters)]
@@ -1,50 +1,1107 @@
+import json
+import multiprocessing as mp
+import os
+import re
+import shutil
+import tempfile
+import time
+
+import numpy as np
 import pandas as pd
+import scipy.sparse as sp
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+
+from ann_index import IVFIndex
+from catalog import append_rows, assign_product_ids, load_catalog, update_rows
+from embedding import LSAEmbedding
+from facets import CatalogFacets
+from filters import predicate_mask
+from metrics import METRICS
+from parallel_build import SharedArrays, attach, fit_tfidf, resolve_jobs
+from quantize import check_dtype, dequantize, empty_scores, quantize_rows, tfidf_dtype
+from rerank import rank_features
+from result_cache import ResultCache
+from results import Recommendations, result_columns
+from search_index import TOKEN, NameSearchIndex
+
+
+def top_k_neighbors(scores, k):
+    # Row-wise top-k of a dense score block, highest first. Ties keep the
+    # lowest column first, same as the stable sort in the dense path.
+    n_rows, n_cols = scores.shape
+    k = min(k, n_cols)
+    out = np.empty((n_rows, k), dtype=np.int64)
+    if k == 0:
+        return out
+    if k == n_cols:
+        return np.argsort(-scores, axis=1, kind="stable")
+    kth = -np.partition(-scores, k - 1, axis=1)[:, k - 1]
+    for r in range(n_rows):
+        row = scores[r]
+        above = np.flatnonzero(row > kth[r])
+        tied = np.flatnonzero(row == kth[r])[:k - len(above)]
+        sel = np.concatenate([above, tied])
+        out[r] = sel[np.argsort(-row[sel], kind="stable")]
+    return out
+
+
+def _artifact_version(path):
+    # Version directory the manifest at path names, None if there is none
+    try:
+        with open(os.path.join(path, "manifest.json"), encoding="utf-8") as f:
+            return json.load(f).get("version")
+    except (OSError, ValueError):
+        return None
+
+
+def group_rows(codes, n_groups):
+    # Rows sorted by group code: order[bounds[g]:bounds[g + 1]] are the rows of
+    # group g, ascending. Negative codes (no category, deleted) are left out.
+    order = np.argsort(codes, kind="stable").astype(np.int32)
+    bounds = np.searchsorted(codes[order], np.arange(n_groups + 1)).astype(np.int64)
+    return order, bounds
+
+
+# Parallel topk build: each pool worker holds a stub engine over shared memory
+_worker = None
+
+
+def _init_neighbor_worker(spec, shape, k, block_size, dtype):
+    global _worker
+    arrays, blocks = attach(spec)
+    engine = SimilarityEngine.__new__(SimilarityEngine)
+    engine.tfidf_matrix = sp.csr_matrix(
+        (arrays["tfidf_data"], arrays["tfidf_indices"], arrays["tfidf_indptr"]),
+        shape=shape, copy=False)
+    engine.k, engine.block_size, engine.dtype = k, block_size, dtype
+    engine.neighbor_indices = arrays["neighbor_indices"]
+    engine.neighbor_scores = arrays["neighbor_scores"]
+    engine.neighbor_scales = arrays.get("neighbor_scales")
+    _worker = (engine, arrays["category_order"], arrays["category_bounds"], blocks)
+
+
+def _neighbor_task(task):
+    code, start, stop = task
+    engine, order, bounds, _ = _worker
+    cat_rows = order[bounds[code]:bounds[code + 1]]
+    engine._fill_neighbors(cat_rows[start:stop], cat_rows)
+
+
+# Bump whenever the on-disk artifact layout changes
+FORMAT_VERSION = 5
+# Compiled filter masks kept per engine (one bool per product each)
+FILTER_MASKS = 256
+# Transformed free-text queries kept per engine (one sparse TF-IDF row each)
+QUERY_VECTORS = 4096
+
 
 class SimilarityEngine:
-    def __init__(self, csv_path):
-        self.data = pd.read_csv(csv_path)
-
-        # TF-IDF vectorizer
-        self.vectorizer = TfidfVectorizer(stop_words='english')
-        self.tfidf_matrix = self.vectorizer.fit_transform(self.data['description'])
-
-        # Entire similarity matrix
-        self.similarity_matrix = cosine_similarity(self.tfidf_matrix)
-
-    def get_similar_products(self, index, top_n=5):
-        category = self.data.iloc[index]["category"]
-
-        # Filter products with same category
-        same_cat_indices = self.data[self.data["category"] == category].index.tolist()
-
-        scores = []
-        for idx in same_cat_indices:
-            scores.append((idx, self.similarity_matrix[index][idx]))
-
-        # Sort by similarity
-        scores = sorted(scores, key=lambda x: x[1], reverse=True)
-
-        # Skip itself
-        scores = [s for s in scores if s[0] != index]
-
-        top_items = scores[:top_n]
-
-        results = []
-        for idx, score in top_items:
-            row = self.data.iloc[idx]
-            desc = str(row.get("description", "") or "").strip()
-            results.append({
-                "name":         row["product_name"],
-                "image":        row["image"],
-                "brand":        row["brand"],
-                "price":        row["discounted_price"],
-                "retail_price": row.get("retail_price", None),
-                "rating":       row["overall_rating"],
-                "score":        round(score, 3),
-                "category":     row["category"],
-                "description":  desc,
-            })
-
-        return results
\ No newline at end of file
+    MODES = ("dense", "topk", "ann", "embedding")
+
+    def __init__(self, catalog_path, mode="dense", k=50, block_size=1024, ann_index=None,
+                 dtype="float32", embedding=None, n_jobs=1, cache_size=1024, cache_ttl=None,
+                 vectorizer=None):
+        if mode not in self.MODES:
+            raise ValueError(f"unknown mode {mode!r}, expected one of {self.MODES}")
+
+        # Seconds per build stage, filled in as the build goes
+        self.build_timings = {}
+        start = time.perf_counter()
+        self.data = load_catalog(catalog_path)
+        self.build_timings["load catalog"] = time.perf_counter() - start
+        self.mode = mode
+        # Storage precision of TF-IDF and similarity scores (see quantize.py)
+        self.dtype = check_dtype(dtype)
+        self.k = k
+        self.block_size = block_size
+        self.ann_index = (ann_index or IVFIndex()) if mode == "ann" else None
+        self.embedding = (embedding or LSAEmbedding()) if mode == "embedding" else None
+        # Worker processes for tokenization and topk neighbour lists
+        self.n_jobs = resolve_jobs(n_jobs)
+        # An already-fitted vectorizer (vocabulary + idf shared by several
+        # engines, e.g. shards) is reused instead of fitting one
+        self.fixed_vectorizer = vectorizer
+        self._init_cache(cache_size, cache_ttl)
+        self.deleted = np.zeros(len(self.data), dtype=bool)
+        start = time.perf_counter()
+        self._build_category_index()
+        self.build_timings["category index"] = time.perf_counter() - start
+        self._fit()
+        self._report_build()
+
+    def _report_build(self):
+        for stage, seconds in self.build_timings.items():
+            METRICS.observe("engine_build_seconds", seconds, stage=stage)
+
+    def _init_cache(self, cache_size, cache_ttl):
+        # Every catalog change bumps the version, which retires cached results
+        self.catalog_version = 0
+        self.result_cache = ResultCache(cache_size, cache_ttl)
+        # Compiled filter masks, per predicate and per whole filter
+        self.filter_masks = ResultCache(FILTER_MASKS)
+        # query_text(): TF-IDF rows of recent query texts
+        self.query_vectors_cache = ResultCache(QUERY_VECTORS)
+
+    def _fit(self):
+        if self.fixed_vectorizer is not None:
+            start = time.perf_counter()
+            self.vectorizer = self.fixed_vectorizer
+            self.tfidf_matrix = self.vectorizer.transform(self.data['description']).astype(
+                tfidf_dtype(self.dtype)).tocsr()
+            self.tfidf_matrix.sort_indices()
+            self.build_timings["tokenize"] = time.perf_counter() - start
+        else:
+            # TF-IDF vectorizer (sharded over n_jobs processes)
+            self.vectorizer, self.tfidf_matrix = fit_tfidf(
+                self.data['description'], tfidf_dtype(self.dtype), self.n_jobs, self.build_timings)
+
+        start = time.perf_counter()
+        self.similarity_matrix = self.similarity_scales = None
+        if self.mode == "dense":
+            # Entire similarity matrix
+            self._build_similarity_matrix()
+            stage = "similarity matrix"
+        elif self.mode == "topk":
+            # Only the k best same-category neighbours of every row
+            self._build_neighbors()
+            stage = "neighbours"
+        elif self.mode == "ann":
+            # Approximate candidates, re-scored exactly at query time
+            self.ann_index.build(self.tfidf_matrix, self.category_rows)
+            stage = "ann index"
+        else:
+            # Dense low-rank embeddings, scored with BLAS at query time
+            self.embedding.build(self.tfidf_matrix, self.category_rows)
+            stage = "embedding"
+        self.build_timings[stage] = time.perf_counter() - start
+
+        self.fitted_rows = len(self.data)
+        self.changes_since_fit = 0
+
+    def _build_category_index(self):
+        # category -> sorted int32 row ids, built once so queries never scan the DataFrame
+        codes, categories = pd.factorize(self.data["category"])
+        self.category_codes = codes.astype(np.int32)
+        self._set_category_rows(list(categories), *group_rows(self.category_codes, len(categories)))
+
+    def _set_category_rows(self, categories, order, bounds):
+        self.categories = categories
+        self.category_rows = [order[bounds[i]:bounds[i + 1]] for i in range(len(categories))]
+        self.category_index = dict(zip(categories, self.category_rows))
+
+    def _replace_category_rows(self, code, rows):
+        self.category_rows[code] = rows
+        self.category_index[self.categories[code]] = rows
+
+    def _build_similarity_matrix(self):
+        # Row blocks straight into the storage dtype: no float64 N x N copy
+        n = len(self.data)
+        self.similarity_matrix, self.similarity_scales = empty_scores((n, n), self.dtype)
+        X = self.tfidf_matrix
+        X_T = X.T.tocsr()
+        for start in range(0, n, self.block_size):
+            stop = min(start + self.block_size, n)
+            diagonal = (np.arange(stop - start), np.arange(start, stop))
+            values, scales = quantize_rows((X[start:stop] @ X_T).toarray(), self.dtype, diagonal)
+            self.similarity_matrix[start:stop] = values
+            if scales is not None:
+                self.similarity_scales[start:stop] = scales
+
+    def _similarity(self, rows, cols=slice(None)):
+        values = self.similarity_matrix[rows][:, cols]
+        scales = None if self.similarity_scales is None else self.similarity_scales[rows]
+        return dequantize(values, scales)
+
+    def _build_neighbors(self):
+        n = len(self.data)
+        self.neighbor_indices = np.full((n, self.k), -1, dtype=np.int32)
+        self.neighbor_scores, self.neighbor_scales = empty_scores((n, self.k), self.dtype)
+        if self.n_jobs > 1:
+            self._build_neighbors_parallel()
+            return
+        for rows in self.category_rows:
+            self._fill_neighbors(rows, rows)
+
+    def _build_neighbors_parallel(self):
+        # Workers attach to TF-IDF and the output tables in shared memory and
+        # fill disjoint row ranges with the same _fill_neighbors as above
+        shared = SharedArrays()
+        try:
+            X = self.tfidf_matrix
+            shared.add("tfidf_data", X.data)
+            shared.add("tfidf_indices", X.indices)
+            shared.add("tfidf_indptr", X.indptr)
+            order, bounds = group_rows(self.category_codes, len(self.categories))
+            shared.add("category_order", order)
+            shared.add("category_bounds", bounds)
+            outputs = ["neighbor_indices", "neighbor_scores", "neighbor_scales"]
+            for name in outputs:
+                if getattr(self, name) is not None:
+                    shared.add(name, getattr(self, name))
+
+            # Large categories are split so every worker gets a share;
+            # biggest first for better load balance
+            step = max(self.block_size, -(-len(self.data) // (self.n_jobs * 4)))
+            sizes = np.diff(bounds)
+            tasks = [(code, start, start + step)
+                     for code in np.argsort(-sizes, kind="stable")
+                     for start in range(0, sizes[code], step)]
+            init_args = (shared.spec(), X.shape, self.k, self.block_size, self.dtype)
+            with mp.Pool(self.n_jobs, _init_neighbor_worker, init_args) as pool:
+                for _ in pool.imap_unordered(_neighbor_task, tasks):
+                    pass
+
+            for name in outputs:
+                if name in shared.arrays:
+                    setattr(self, name, np.array(shared.arrays[name]))
+        finally:
+            shared.close()
+
+    def _neighbor_scores(self, rows):
+        scales = None if self.neighbor_scales is None else self.neighbor_scales[rows]
+        return dequantize(self.neighbor_scores[rows], scales)
+
+    def _set_neighbors(self, rows, indices, scores):
+        # Whole rows at a time, so int8 rows can be re-scaled
+        self.neighbor_indices[rows] = indices
+        values, scales = quantize_rows(scores, self.dtype)
+        self.neighbor_scores[rows] = values
+        if scales is not None:
+            self.neighbor_scales[rows] = scales
+
+    def _fill_neighbors(self, query_rows, cat_rows):
+        # Exact top-k of query_rows (a subset of cat_rows) among cat_rows,
+        # scored one row block at a time
+        width = min(self.k, len(cat_rows) - 1)
+        if width <= 0:
+            self._set_neighbors(query_rows, -1, np.zeros((len(query_rows), self.k)))
+            return
+
+        X = self.tfidf_matrix
+        X_cat_T = X[cat_rows].T.tocsr()
+        self_pos = np.searchsorted(cat_rows, query_rows)
+        for start in range(0, len(query_rows), self.block_size):
+            rows = query_rows[start:start + self.block_size]
+            block = (X[rows] @ X_cat_T).toarray()
+            # Never recommend a product to itself
+            block[np.arange(len(rows)), self_pos[start:start + self.block_size]] = -np.inf
+            top = top_k_neighbors(block, width)
+            indices = np.full((len(rows), self.k), -1, dtype=np.int32)
+            scores = np.zeros((len(rows), self.k))
+            indices[:, :width] = cat_rows[top]
+            scores[:, :width] = np.take_along_axis(block, top, axis=1)
+            self._set_neighbors(rows, indices, scores)
+
+    def _merge_neighbors(self, rows, candidates):
+        # Let candidates compete for slots in the existing lists of rows
+        X = self.tfidf_matrix
+        X_cand_T = X[candidates].T.tocsr()
+        for start in range(0, len(rows), self.block_size):
+            block_rows = rows[start:start + self.block_size]
+            current = self.neighbor_indices[block_rows]
+            idx = np.hstack([current, np.broadcast_to(candidates, (len(block_rows), len(candidates)))])
+            scores = np.hstack([np.where(current < 0, -np.inf, self._neighbor_scores(block_rows)),
+                                (X[block_rows] @ X_cand_T).toarray()])
+
+            # Order by row id first so score ties still go to the lowest row
+            order = np.argsort(np.where(idx < 0, np.iinfo(np.int32).max, idx), axis=1, kind="stable")
+            idx = np.take_along_axis(idx, order, axis=1)
+            scores = np.take_along_axis(scores, order, axis=1)
+
+            top = top_k_neighbors(scores, self.k)
+            idx = np.take_along_axis(idx, top, axis=1)
+            scores = np.take_along_axis(scores, top, axis=1)
+            empty = np.isneginf(scores)
+            self._set_neighbors(block_rows, np.where(empty, -1, idx), np.where(empty, 0, scores))
+
+    # ─── Incremental catalog updates (topk mode) ─────────────────────────────
+    # New and edited descriptions go through the frozen vocabulary/idf; only
+    # the neighbour lists that can change are recomputed. Removed rows are
+    # tombstoned (row ids stay stable) until compact() drops them and refits.
+
+    def _check_incremental(self):
+        if self.mode != "topk":
+            raise ValueError(f"incremental updates need mode='topk', engine is {self.mode!r}")
+        # Memory-mapped artifacts are read-only; take private copies before mutating
+        for name in ("deleted", "category_codes", "neighbor_indices", "neighbor_scores",
+                     "neighbor_scales"):
+            arr = getattr(self, name)
+            if arr is not None and not arr.flags.writeable:
+                setattr(self, name, np.array(arr))
+
+    def _category_codes_for(self, values):
+        codes = np.full(len(values), -1, dtype=np.int32)
+        lookup = {c: i for i, c in enumerate(self.categories)}
+        for i, value in enumerate(values):
+            if pd.isna(value):
+                continue
+            if value not in lookup:
+                lookup[value] = len(self.categories)
+                self.categories.append(value)
+                self.category_rows.append(np.empty(0, dtype=np.int32))
+                self.category_index[value] = self.category_rows[-1]
+            codes[i] = lookup[value]
+        return codes
+
+    def _move_category_rows(self, rows, old_codes, new_codes):
+        for code in np.unique(old_codes[old_codes >= 0]):
+            self._replace_category_rows(code, np.setdiff1d(
+                self.category_rows[code], rows[old_codes == code]).astype(np.int32))
+        for code in np.unique(new_codes[new_codes >= 0]):
+            self._replace_category_rows(code, np.union1d(
+                self.category_rows[code], rows[new_codes == code]).astype(np.int32))
+
+    def _refresh_neighbors(self, changed, removed):
+        dirty = np.union1d(changed, removed)
+        if len(dirty) == 0:
+            return
+
+        # Lists that point at a changed or removed row are recomputed in full
+        stale = np.flatnonzero(np.isin(self.neighbor_indices, dirty).any(axis=1))
+        stale = np.union1d(stale, changed).astype(np.int32)
+        stale = stale[~self.deleted[stale]]
+        stale_codes = self.category_codes[stale]
+        orphans = stale[stale_codes < 0]
+        self._set_neighbors(orphans, -1, np.zeros((len(orphans), self.k)))
+        for code in np.unique(stale_codes[stale_codes >= 0]):
+            self._fill_neighbors(stale[stale_codes == code], self.category_rows[code])
+
+        # Every other list only has to consider the changed rows as newcomers
+        changed_codes = self.category_codes[changed]
+        for code in np.unique(changed_codes[changed_codes >= 0]):
+            rows = np.setdiff1d(self.category_rows[code], stale).astype(np.int32)
+            if len(rows):
+                self._merge_neighbors(rows, changed[changed_codes == code])
+
+    def add_products(self, df):
+        # Returns the row of each added product. A product id that was
+        # removed earlier is relisted on its old row rather than appended,
+        # so product ids stay unique.
+        self._check_incremental()
+        df = assign_product_ids(df.reset_index(drop=True))
+        # Against every id, removed ones included
+        known = self.id_index.get_indexer(pd.Index(df["product_id"], dtype=object)).astype(np.int32)
+        relisted = known >= 0
+        if not self.deleted[known[relisted]].all():
+            raise ValueError("add_products() got product ids already in the catalog; "
+                             "use update_products() to edit them")
+
+        rows = np.empty(len(df), dtype=np.int32)
+        if relisted.any():
+            rows[relisted] = known[relisted]
+            self.deleted[known[relisted]] = False
+            self.update_products(df[relisted].set_index(pd.Index(known[relisted])))
+        if not relisted.all():
+            rows[~relisted] = self._append_products(df[~relisted].reset_index(drop=True))
+        return rows
+
+    def _append_products(self, df):
+        rows = np.arange(len(self.data), len(self.data) + len(df), dtype=np.int32)
+
+        self.data = append_rows(self.data, df)
+        self.tfidf_matrix = sp.vstack(
+            [self.tfidf_matrix, self.vectorizer.transform(df["description"])], format="csr")
+        self.deleted = np.concatenate([self.deleted, np.zeros(len(df), dtype=bool)])
+        self.neighbor_indices = np.vstack(
+            [self.neighbor_indices, np.full((len(df), self.k), -1, dtype=np.int32)])
+        scores, scales = empty_scores((len(df), self.k), self.dtype)
+        self.neighbor_scores = np.vstack([self.neighbor_scores, scores])
+        if scales is not None:
+            self.neighbor_scales = np.concatenate([self.neighbor_scales, scales])
+
+        codes = self._category_codes_for(df["category"])
+        self.category_codes = np.concatenate([self.category_codes, codes])
+        self._move_category_rows(rows, np.full(len(rows), -1, dtype=np.int32), codes)
+
+        self._search_index = self._term_index = None
+        self._id_index = self._name_index = None
+        self._refresh_neighbors(rows, np.empty(0, dtype=np.int32))
+        self.changes_since_fit += len(rows)
+        self.catalog_version += 1
+        return rows
+
+    def remove_products(self, rows):
+        self._check_incremental()
+        rows = np.unique(np.asarray(rows, dtype=np.int32))
+        rows = rows[~self.deleted[rows]]
+
+        self.deleted[rows] = True
+        self._move_category_rows(rows, self.category_codes[rows], np.full(len(rows), -1, dtype=np.int32))
+        self.category_codes[rows] = -1
+        self._set_neighbors(rows, -1, np.zeros((len(rows), self.k)))
+
+        self._search_index = None
+        self._refresh_neighbors(np.empty(0, dtype=np.int32), rows)
+        self.changes_since_fit += len(rows)
+        self.catalog_version += 1
+
+    def update_products(self, df):
+        # df is indexed by the row ids to edit; only its columns are overwritten
+        self._check_incremental()
+        rows = df.index.to_numpy().astype(np.int32)
+        if len(rows) and (rows.max() >= len(self.data) or self.deleted[rows].any()):
+            raise KeyError("update_products() got row ids that are unknown or removed")
+        # Product ids are stable: never overwritten by an update
+        df = df.drop(columns="product_id", errors="ignore")
+
+        update_rows(self.data, rows, df)
+        self._search_index = self._term_index = None
+        self._name_index = None
+        self.catalog_version += 1
+
+        if "description" in df.columns:
+            X = self.tfidf_matrix
+            stacked = sp.vstack([X, self.vectorizer.transform(df["description"])], format="csr")
+            order = np.arange(X.shape[0])
+            order[rows] = X.shape[0] + np.arange(len(rows))
+            self.tfidf_matrix = stacked[order]
+        if "category" in df.columns:
+            codes = self._category_codes_for(df["category"])
+            self._move_category_rows(rows, self.category_codes[rows], codes)
+            self.category_codes[rows] = codes
+
+        if "description" in df.columns or "category" in df.columns:
+            self._refresh_neighbors(rows, np.empty(0, dtype=np.int32))
+            self.changes_since_fit += len(rows)
+
+    def drift(self):
+        # Share of the catalog added, edited or removed since the idf was fitted
+        return self.changes_since_fit / max(self.fitted_rows, 1)
+
+    def compact(self, threshold=0.2):
+        # Run on a schedule: once drift crosses threshold, drop tombstones and
+        # refit idf + neighbours. Rows are renumbered, so callers must re-resolve ids.
+        if self.drift() < threshold:
+            return False
+        self.data = self.data[~self.deleted].reset_index(drop=True)
+        self.deleted = np.zeros(len(self.data), dtype=bool)
+        self._search_index = self._term_index = None
+        self._id_index = self._name_index = None
+        self.build_timings = {}
+        self.catalog_version += 1
+        self._build_category_index()
+        self._fit()
+        self._report_build()
+        return True
+
+    def _arrays(self):
+        X = self.tfidf_matrix.tocsr()
+        category_order, category_bounds = group_rows(self.category_codes, len(self.categories))
+        arrays = {
+            "idf": self.vectorizer.idf_,
+            "tfidf_data": X.data,
+            "tfidf_indices": X.indices,
+            "tfidf_indptr": X.indptr,
+            "category_codes": self.category_codes,
+            "category_order": category_order,
+            "category_bounds": category_bounds,
+            "deleted": self.deleted,
+        }
+        if self.mode == "topk":
+            arrays["neighbor_indices"] = self.neighbor_indices
+            arrays["neighbor_scores"] = self.neighbor_scores
+            if self.neighbor_scales is not None:
+                arrays["neighbor_scales"] = self.neighbor_scales
+        elif self.mode == "ann":
+            for name, arr in self.ann_index.arrays().items():
+                arrays["ann_" + name] = arr
+        elif self.mode == "embedding":
+            for name, arr in self.embedding.arrays().items():
+                arrays["embedding_" + name] = arr
+        else:
+            arrays["similarity_matrix"] = self.similarity_matrix
+            if self.similarity_scales is not None:
+                arrays["similarity_scales"] = self.similarity_scales
+        return arrays
+
+    def save(self, path):
+        # Every save writes a new version directory under path, then
+        # atomically replaces manifest.json, which names it. Files that a
+        # running process may have memory-mapped are never rewritten.
+        os.makedirs(path, exist_ok=True)
+        previous = _artifact_version(path)
+        version_dir = tempfile.mkdtemp(prefix="v-", dir=path)
+        os.chmod(version_dir, 0o755)
+        version = os.path.basename(version_dir)
+        for name, arr in self._arrays().items():
+            np.save(os.path.join(version_dir, name + ".npy"), np.ascontiguousarray(arr))
+
+        terms = self.vectorizer.get_feature_names_out().tolist()
+        with open(os.path.join(version_dir, "vocabulary.json"), "w", encoding="utf-8") as f:
+            json.dump(terms, f, ensure_ascii=False)
+        # The catalog as an uncompressed Arrow file: loaders map it, so the
+        # text columns are shared page cache rather than a copy per process
+        import pyarrow as pa
+        import pyarrow.feather as feather
+        feather.write_feather(pa.Table.from_pandas(self.data, preserve_index=False),
+                              os.path.join(version_dir, "catalog.arrow"), compression="uncompressed")
+
+        # Manifest goes last: until it is replaced, loaders see the previous version
+        manifest = {
+            "format_version": FORMAT_VERSION,
+            "version": version,
+            "mode": self.mode,
+            "dtype": self.dtype,
+            "k": self.k,
+            "block_size": self.block_size,
+            "n_rows": len(self.data),
+            "n_features": len(terms),
+            "categories": self.categories,
+            "fitted_rows": self.fitted_rows,
+            "changes_since_fit": self.changes_since_fit,
+            "ann": self.ann_index.params() if self.mode == "ann" else None,
+            "embedding": self.embedding.params() if self.mode == "embedding" else None,
+        }
+        staged = os.path.join(path, f"manifest.json.{version}")
+        with open(staged, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(staged, os.path.join(path, "manifest.json"))
+
+        # The previous version stays for loaders that read the old manifest
+        # just before the swap; older versions and pre-v4 top-level files go.
+        # Unlinking is safe for processes that still map them.
+        for name in os.listdir(path):
+            full = os.path.join(path, name)
+            if name in (version, previous, "manifest.json"):
+                continue
+            if name.startswith("v-") and os.path.isdir(full):
+                shutil.rmtree(full, ignore_errors=True)
+            elif name.endswith(".npy") or name in ("vocabulary.json", "catalog.pkl"):
+                os.remove(full)
+
+    @classmethod
+    def load(cls, path, mmap=True, cache_size=1024, cache_ttl=None):
+        start = time.perf_counter()
+        manifest_path = os.path.join(path, "manifest.json")
+        if not os.path.exists(manifest_path):
+            raise FileNotFoundError(f"no engine artifacts at {path!r} (missing manifest.json)")
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest["format_version"] != FORMAT_VERSION:
+            raise ValueError(f"artifacts at {path!r} are format v{manifest['format_version']}, "
+                             f"this engine reads v{FORMAT_VERSION}; rebuild them with build_index.py")
+
+        mmap_mode = "r" if mmap else None
+        files = os.path.join(path, manifest["version"])
+
+        def array(name):
+            return np.load(os.path.join(files, name + ".npy"), mmap_mode=mmap_mode)
+
+        engine = cls.__new__(cls)
+        engine.mode = manifest["mode"]
+        engine.dtype = manifest["dtype"]
+        engine.k = manifest["k"]
+        engine.block_size = manifest["block_size"]
+        engine.fitted_rows = manifest["fitted_rows"]
+        engine.changes_since_fit = manifest["changes_since_fit"]
+        engine.n_jobs = 1
+        engine.build_timings = {}
+        engine._init_cache(cache_size, cache_ttl)
+        import pyarrow.feather as feather
+        engine.data = feather.read_table(os.path.join(files, "catalog.arrow"), memory_map=mmap).to_pandas()
+
+        with open(os.path.join(files, "vocabulary.json"), encoding="utf-8") as f:
+            terms = json.load(f)
+        engine.vectorizer = TfidfVectorizer(stop_words='english',
+                                            vocabulary={t: i for i, t in enumerate(terms)})
+        engine.vectorizer.idf_ = np.asarray(array("idf"))
+        engine.fixed_vectorizer = None
+
+        engine.tfidf_matrix = sp.csr_matrix(
+            (array("tfidf_data"), array("tfidf_indices"), array("tfidf_indptr")),
+            shape=(manifest["n_rows"], manifest["n_features"]), copy=False)
+
+        engine.deleted = array("deleted")
+        engine.category_codes = array("category_codes")
+        engine._set_category_rows(manifest["categories"],
+                                  array("category_order"), array("category_bounds"))
+
+        engine.similarity_matrix = engine.similarity_scales = None
+        engine.ann_index = engine.embedding = None
+        scaled = engine.dtype == "int8"
+        if engine.mode == "topk":
+            engine.neighbor_indices = array("neighbor_indices")
+            engine.neighbor_scores = array("neighbor_scores")
+            engine.neighbor_scales = array("neighbor_scales") if scaled else None
+        elif engine.mode == "ann":
+            names = ["components", "embeddings", "centroids",
+                     "list_offsets", "list_rows", "category_lists"]
+            engine.ann_index = IVFIndex.from_arrays(
+                manifest["ann"], {name: array("ann_" + name) for name in names})
+        elif engine.mode == "embedding":
+            names = ["components", "vectors", "row_order", "category_offsets", "positions"]
+            engine.embedding = LSAEmbedding.from_arrays(
+                manifest["embedding"], {name: array("embedding_" + name) for name in names})
+        else:
+            engine.similarity_matrix = array("similarity_matrix")
+            engine.similarity_scales = array("similarity_scales") if scaled else None
+        METRICS.observe("engine_load_seconds", time.perf_counter() - start)
+        return engine
+
+    @property
+    def search_index(self):
+        # Built on first search; catalog updates drop it so it is rebuilt
+        if getattr(self, "_search_index", None) is None:
+            labels = self.data["category_label"].cat
+            self._search_index = NameSearchIndex(self.data["product_name"],
+                                                 labels.codes.to_numpy(np.int32))
+            self._search_labels = {label: i for i, label in enumerate(labels.categories)}
+        return self._search_index
+
+    @property
+    def facets(self):
+        # Category facets, totals and paged listings for UIs (facets.py),
+        # rebuilt once per catalog version
+        cached = getattr(self, "_facets", None)
+        if cached is None or cached[0] != self.catalog_version:
+            cached = self._facets = (self.catalog_version, CatalogFacets(self.data, self.deleted))
+        return cached[1]
+
+    def search_products(self, query, category=None, limit=20, offset=0):
+        # Ranked product-name matches as (row ids for this page, total matches);
+        # category is a category_label
+        with METRICS.timer("search_seconds"):
+            if not re.search(TOKEN, query):
+                # No query: a page of the shared listing, no catalog scan
+                return self.facets.listing(category, limit, offset)
+            index = self.search_index
+            group = None
+            if category is not None:
+                group = self._search_labels.get(category, -2)
+            return index.search(query, group=group, exclude=np.asarray(self.deleted),
+                                limit=limit, offset=offset)
+
+    # ─── Product id / name -> row lookups ────────────────────────────────────
+    # Hash-based pandas indexes, built on first use. Removed rows never match.
+
+    @property
+    def id_index(self):
+        if getattr(self, "_id_index", None) is None:
+            self._id_index = pd.Index(self.data["product_id"])
+        return self._id_index
+
+    @property
+    def name_index(self):
+        if getattr(self, "_name_index", None) is None:
+            self._name_index = pd.Index(self.data["product_name"])
+        return self._name_index
+
+    def rows_for_ids(self, product_ids):
+        # int32 row per id, -1 where unknown or removed
+        rows = self.id_index.get_indexer(pd.Index(product_ids, dtype=object)).astype(np.int32)
+        rows[(rows >= 0) & np.asarray(self.deleted)[np.maximum(rows, 0)]] = -1
+        return rows
+
+    def row_for_id(self, product_id):
+        row = self.rows_for_ids([product_id])[0]
+        if row < 0:
+            raise KeyError(product_id)
+        return int(row)
+
+    def rows_for_name(self, name):
+        # Names are not unique: every live row with exactly this name
+        try:
+            loc = self.name_index.get_loc(name)
+        except KeyError:
+            return np.empty(0, dtype=np.int32)
+        rows = np.arange(len(self.data), dtype=np.int32)[loc].reshape(-1)
+        return rows[~np.asarray(self.deleted)[rows]]
+
+    def similarity_submatrix(self, indices):
+        # Pairwise scores between a handful of rows, straight from TF-IDF
+        # (or from the embeddings the embedding mode ranks with)
+        if self.mode == "embedding":
+            vectors = self.embedding.vectors_for(list(indices))
+            return vectors @ vectors.T
+        rows = self.tfidf_matrix[list(indices)]
+        return (rows @ rows.T).toarray()
+
+    def filter_mask(self, filters):
+        # Boolean mask of the products filters allow, None for no filters.
+        # Masks are compiled once per catalog version, predicate by predicate,
+        # so filters sharing a predicate share its mask.
+        if not filters:
+            return None
+        hit, mask = self.filter_masks.get(filters.key, self.catalog_version)
+        if hit:
+            return mask
+        with METRICS.timer("filter_compile_seconds"):
+            mask = np.ones(len(self.data), dtype=bool)
+            for predicate in filters.key:
+                hit, part = self.filter_masks.get(predicate, self.catalog_version)
+                if not hit:
+                    part = predicate_mask(self.data, predicate)
+                    part.flags.writeable = False
+                    self.filter_masks.put(predicate, self.catalog_version, part)
+                mask &= part
+        mask.flags.writeable = False
+        self.filter_masks.put(filters.key, self.catalog_version, mask)
+        return mask
+
+    def _ranked_neighbors(self, index, top_n, mask=None):
+        if self.mode == "topk":
+            return self._rank_topk(index, top_n, mask)
+
+        if self.mode == "ann":
+            return self._rank_ann(index, top_n, mask=mask)
+
+        if self.mode == "embedding":
+            return self._rank_embedding(index, top_n, mask)
+
+        with METRICS.timer("similar_stage_seconds", stage="scores"):
+            row_scores = self.similarity_matrix[index]
+            if self.similarity_scales is not None:
+                row_scores = row_scores * self.similarity_scales[index]
+        return self._rank_in_category(index, row_scores, top_n, mask)
+
+    def _rank_topk(self, index, top_n, mask=None):
+        nbrs = self.neighbor_indices[index]
+        listed = nbrs >= 0
+        valid = listed if mask is None else listed & mask[np.maximum(nbrs, 0)]
+        ranked = list(zip(nbrs[valid][:top_n].tolist(),
+                          self._neighbor_scores([index])[0][valid][:top_n].tolist()))
+        # A filter can leave fewer than top_n of the k stored neighbours; if
+        # the list was full, the rest of the category may still hold matches
+        if len(ranked) < top_n and listed.all():
+            return self._rank_exact(index, top_n, mask)
+        return ranked
+
+    def _rank_exact(self, index, top_n, mask):
+        # Eligible same-category rows scored straight from TF-IDF
+        code = self.category_codes[index]
+        if code < 0:
+            return []
+        with METRICS.timer("similar_stage_seconds", stage="candidates"):
+            candidates = self.category_rows[code]
+            keep = candidates != index
+            if mask is not None:
+                keep &= mask[candidates]
+            candidates = candidates[keep]
+        with METRICS.timer("similar_stage_seconds", stage="scores"):
+            scores = (self.tfidf_matrix[candidates] @ self.tfidf_matrix[index].T).toarray().ravel()
+        return self._top_candidates(candidates, scores, top_n)
+
+    def _rank_in_category(self, index, row_scores, top_n, mask=None):
+        code = self.category_codes[index]
+        if code < 0:
+            return []
+
+        # Same-category candidates, minus the product itself
+        with METRICS.timer("similar_stage_seconds", stage="candidates"):
+            candidates = self.category_rows[code]
+            keep = candidates != index
+            if mask is not None:
+                keep &= mask[candidates]
+            candidates = candidates[keep]
+            scores = row_scores[candidates]
+        return self._top_candidates(candidates, scores, top_n)
+
+    def _rank_ann(self, index, top_n, nprobe=None, mask=None):
+        code = self.category_codes[index]
+        if code < 0:
+            return []
+
+        # Probe the nearest lists, then score the survivors exactly
+        with METRICS.timer("similar_stage_seconds", stage="candidates"):
+            candidates = np.sort(self.ann_index.candidates(index, code, nprobe))
+            keep = candidates != index
+            if mask is not None:
+                keep &= mask[candidates]
+            candidates = candidates[keep]
+        if mask is not None and len(candidates) < top_n:
+            # The probed lists ran out of eligible products
+            return self._rank_exact(index, top_n, mask)
+        with METRICS.timer("similar_stage_seconds", stage="scores"):
+            scores = (self.tfidf_matrix[candidates] @ self.tfidf_matrix[index].T).toarray().ravel()
+        return self._top_candidates(candidates, scores, top_n)
+
+    def _rank_embedding(self, index, top_n, mask=None):
+        code = self.category_codes[index]
+        if code < 0:
+            return []
+
+        # One GEMV against the category's contiguous embedding block
+        with METRICS.timer("similar_stage_seconds", stage="scores"):
+            candidates, vectors = self.embedding.category_block(code)
+            scores = vectors @ self.embedding.vectors_for(index)
+            keep = candidates != index
+            if mask is not None:
+                keep &= mask[candidates]
+        return self._top_candidates(candidates[keep], scores[keep], top_n)
+
+    def _top_candidates(self, candidates, scores, top_n):
+        # Partial selection: only the top_n candidates are ever sorted
+        with METRICS.timer("similar_stage_seconds", stage="select"):
+            top = top_k_neighbors(scores[np.newaxis, :], top_n)[0]
+        return list(zip(candidates[top].tolist(), scores[top].tolist()))
+
+    def _ranked_neighbors_batch(self, indices, top_n, mask=None, min_results=None):
+        # (len(indices), top_n) neighbour ids and scores, padded with -1 / 0.
+        # In topk mode a row falls back to exact scoring only when its stored
+        # list holds fewer than min_results (default top_n) eligible rows
+        min_results = top_n if min_results is None else min_results
+        out_idx = np.full((len(indices), top_n), -1, dtype=np.int32)
+        out_scores = np.zeros((len(indices), top_n), dtype=np.float32)
+
+        if self.mode == "topk" and mask is None:
+            width = min(top_n, self.k)
+            out_idx[:, :width] = self.neighbor_indices[indices, :width]
+            out_scores[:, :width] = self._neighbor_scores(indices)[:, :width]
+            if min_results > self.k:
+                # As in _rank_topk: full lists are only the category's top k
+                for i in np.flatnonzero((self.neighbor_indices[indices] >= 0).all(axis=1)):
+                    ranked = self._rank_exact(indices[i], top_n, None)
+                    out_idx[i, :len(ranked)] = [idx for idx, _ in ranked]
+                    out_scores[i, :len(ranked)] = [score for _, score in ranked]
+        elif self.mode == "topk":
+            # Eligible stored neighbours moved to the front, rank order kept;
+            # rows the filter leaves short fall back to exact scoring
+            nbrs = self.neighbor_indices[indices]
+            listed = nbrs >= 0
+            valid = listed & mask[np.maximum(nbrs, 0)]
+            order = np.argsort(~valid, axis=1, kind="stable")[:, :top_n]
+            width = order.shape[1]
+            kept = np.take_along_axis(valid, order, axis=1)
+            out_idx[:, :width] = np.where(kept, np.take_along_axis(nbrs, order, axis=1), -1)
+            out_scores[:, :width] = np.where(
+                kept, np.take_along_axis(self._neighbor_scores(indices), order, axis=1), 0)
+            for i in np.flatnonzero((valid.sum(axis=1) < min_results) & listed.all(axis=1)):
+                ranked = self._rank_exact(indices[i], top_n, mask)
+                out_idx[i] = -1
+                out_scores[i] = 0
+                out_idx[i, :len(ranked)] = [idx for idx, _ in ranked]
+                out_scores[i, :len(ranked)] = [score for _, score in ranked]
+        elif self.mode == "ann":
+            for i, index in enumerate(indices):
+                ranked = self._ranked_neighbors(index, top_n, mask)
+                out_idx[i, :len(ranked)] = [idx for idx, _ in ranked]
+                out_scores[i, :len(ranked)] = [score for _, score in ranked]
+        else:
+            # One gather (dense) or GEMM (embedding) + partial sort per
+            # category instead of per query
+            codes = self.category_codes[indices]
+            for code in np.unique(codes[codes >= 0]):
+                pos = np.flatnonzero(codes == code)
+                cands = self.category_rows[code]
+                if self.mode == "embedding":
+                    cand_vectors = self.embedding.category_block(code)[1]
+                for start in range(0, len(pos), self.block_size):
+                    block_pos = pos[start:start + self.block_size]
+                    queries = indices[block_pos]
+                    if self.mode == "embedding":
+                        block = self.embedding.vectors_for(queries) @ cand_vectors.T
+                    else:
+                        block = self._similarity(queries, cands)
+                    if mask is not None:
+                        block[:, ~mask[cands]] = -np.inf
+                    block[np.arange(len(queries)), np.searchsorted(cands, queries)] = -np.inf
+                    top = top_k_neighbors(block, min(top_n, len(cands) - 1))
+                    width = top.shape[1]
+                    scores = np.take_along_axis(block, top, axis=1)
+                    # Excluded candidates sort last; they only pad short rows
+                    excluded = np.isneginf(scores)
+                    out_idx[block_pos, :width] = np.where(excluded, -1, cands[top])
+                    out_scores[block_pos, :width] = np.where(excluded, 0, scores)
+        return out_idx, out_scores
+
+    def get_similar_products_batch(self, indices, top_n=5, filters=None, rerank=None):
+        # Columnar results for many products at once: equal-length arrays,
+        # one entry per (query, rank), ready for pd.DataFrame / pyarrow.table
+        indices = np.asarray(indices, dtype=np.int32)
+        with METRICS.timer("similar_batch_seconds"):
+            mask = self.filter_mask(filters)
+            if rerank is None:
+                nbr_idx, nbr_scores = self._ranked_neighbors_batch(indices, top_n, mask)
+            else:
+                nbr_idx, nbr_scores = self._reranked_batch(indices, top_n, mask, rerank)
+        valid = nbr_idx >= 0
+        return {
+            "query":    np.repeat(indices, valid.sum(axis=1)),
+            "rank":     np.broadcast_to(np.arange(1, top_n + 1, dtype=np.int16), valid.shape)[valid],
+            "neighbor": nbr_idx[valid],
+            "score":    nbr_scores[valid],
+        }
+
+    def get_similar_products(self, index, top_n=5, filters=None, rerank=None):
+        # Served from the LRU cache when possible. The result (results.py) is
+        # shared by every caller and reads like a tuple of read-only mappings;
+        # to_dicts() gives editable plain dicts.
+        # filters (filters.py) narrow the same-category candidates; rerank
+        # (rerank.py) reorders the best of them on rating, price, popularity
+        # and diversity.
+        with METRICS.request("similar_request_seconds"):
+            with METRICS.timer("similar_stage_seconds", stage="cache"):
+                key = (self.data["product_id"].iat[index], top_n, filters.key if filters else (),
+                       rerank.key if rerank else ())
+                hit, results = self.result_cache.get(key, self.catalog_version)
+            METRICS.count("similar_requests_total", cache="hit" if hit else "miss")
+            if not hit:
+                results = self._similar_products(index, top_n, filters, rerank)
+                self.result_cache.put(key, self.catalog_version, results)
+            return results
+
+    def _similar_products(self, index, top_n, filters=None, rerank=None):
+        with METRICS.timer("similar_stage_seconds", stage="rank"):
+            mask = self.filter_mask(filters)
+            if rerank is None:
+                top_items = self._ranked_neighbors(index, top_n, mask)
+            else:
+                nbr_idx, nbr_scores = self._reranked_batch(np.array([index], dtype=np.int32),
+                                                           top_n, mask, rerank)
+                valid = nbr_idx[0] >= 0
+                top_items = list(zip(nbr_idx[0][valid].tolist(), nbr_scores[0][valid].tolist()))
+        return self._materialize(top_items)
+
+    # ─── Re-ranking ──────────────────────────────────────────────────────────
+    # Two stages: the usual similarity ranking fetches rerank.candidates
+    # neighbours per query (the stored lists in topk mode), then the
+    # reranker reorders just those from the rank_features arrays.
+
+    @property
+    def rank_features(self):
+        # Re-ranking features as arrays, rebuilt once per catalog version
+        cached = getattr(self, "_rank_features", None)
+        if cached is None or cached[0] != self.catalog_version:
+            cached = self._rank_features = (self.catalog_version, rank_features(self.data))
+        return cached[1]
+
+    def _reranked_batch(self, indices, top_n, mask, rerank):
+        width = rerank.candidates
+        if self.mode == "topk":
+            # More than k would fall back to exact scoring on every query; a
+            # filter only sends a query to exact scoring when it leaves fewer
+            # than top_n of the stored candidates
+            width = min(width, self.k)
+        nbr_idx, nbr_scores = self._ranked_neighbors_batch(indices, max(width, top_n), mask,
+                                                           min_results=top_n)
+        with METRICS.timer("similar_stage_seconds", stage="rerank"):
+            return rerank.rank(nbr_idx, nbr_scores, top_n, self.rank_features,
+                               self.similarity_submatrix)
+
+    @property
+    def result_columns(self):
+        # Result fields as arrays, rebuilt once per catalog version
+        cached = getattr(self, "_result_columns", None)
+        if cached is None or cached[0] != self.catalog_version:
+            cached = self._result_columns = (self.catalog_version, result_columns(self.data))
+        return cached[1]
+
+    def _materialize(self, top_items):
+        with METRICS.timer("similar_stage_seconds", stage="materialize"):
+            rows = np.fromiter((idx for idx, _ in top_items), dtype=np.int64, count=len(top_items))
+            scores = np.fromiter((score for _, score in top_items), dtype=np.float64,
+                                 count=len(top_items))
+            return Recommendations(rows, scores, self.result_columns)
+
+    # ─── Free-text queries ───────────────────────────────────────────────────
+    # Text (a search phrase, or the description of a product that is not in
+    # the catalog yet) goes through the fitted vectorizer and is scored
+    # against the stored TF-IDF rows (LSA embeddings in embedding mode);
+    # the similarity matrix and neighbour tables are never touched.
+
+    @property
+    def term_index(self):
+        # TF-IDF transposed to term -> rows, built on first text query, so a
+        # query only reads the postings of its own terms
+        if getattr(self, "_term_index", None) is None:
+            self._term_index = self.tfidf_matrix.T.tocsr()
+        return self._term_index
+
+    def query_vectors(self, texts):
+        # (len(texts), n_features) TF-IDF rows; repeated texts come from the cache
+        rows, missing = [None] * len(texts), {}
+        for i, text in enumerate(texts):
+            hit, row = self.query_vectors_cache.get(text, self.catalog_version)
+            if hit:
+                rows[i] = row
+            else:
+                missing.setdefault(text, []).append(i)
+        if missing:
+            with METRICS.timer("query_text_stage_seconds", stage="transform"):
+                transformed = self.vectorizer.transform(list(missing)).astype(
+                    self.tfidf_matrix.dtype).tocsr()
+            for j, (text, positions) in enumerate(missing.items()):
+                row = transformed[j]
+                self.query_vectors_cache.put(text, self.catalog_version, row)
+                for i in positions:
+                    rows[i] = row
+        if not rows:
+            return sp.csr_matrix((0, self.tfidf_matrix.shape[1]), dtype=self.tfidf_matrix.dtype)
+        return sp.vstack(rows, format="csr")
+
+    def _text_mask(self, category, filters):
+        # Live rows allowed by category (engine category or its label) and filters
+        mask = ~np.asarray(self.deleted)
+        if category is not None:
+            key = ("category", category)
+            hit, in_category = self.filter_masks.get(key, self.catalog_version)
+            if not hit:
+                if category in self.category_index:
+                    in_category = np.zeros(len(self.data), dtype=bool)
+                    in_category[self.category_index[category]] = True
+                else:
+                    in_category = (self.data["category_label"] == category).to_numpy(dtype=bool)
+                self.filter_masks.put(key, self.catalog_version, in_category)
+            mask &= in_category
+        filter_mask = self.filter_mask(filters)
+        if filter_mask is not None:
+            mask &= filter_mask
+        return mask
+
+    def _rank_texts(self, texts, top_n, category, filters):
+        # One [(row, score), ...] list per text
+        vectors = self.query_vectors(texts)
+        mask = self._text_mask(category, filters)
+        ranked = []
+        if self.mode == "embedding":
+            # One GEMM of the embedded texts against the contiguous vectors
+            # (just the category's block for an engine category), then the
+            # eligible rows' scores picked by position: no vector is copied
+            with METRICS.timer("query_text_stage_seconds", stage="scores"):
+                candidates = np.flatnonzero(mask).astype(np.int32)
+                positions = self.embedding.positions[candidates]
+                if category in self.category_index:
+                    code = self.categories.index(category)
+                    block = self.embedding.category_block(code)[1]
+                    positions = positions - self.embedding.category_offsets[code]
+                else:
+                    block = self.embedding.vectors
+                scores = self.embedding.transform(vectors) @ block.T
+            for i in range(len(texts)):
+                # A text with no known term has no neighbours
+                ranked.append(self._top_candidates(candidates, scores[i][positions], top_n)
+                              if vectors[i].nnz else [])
+            return ranked
+
+        with METRICS.timer("query_text_stage_seconds", stage="scores"):
+            # Sparse scores: only rows sharing a term with the query
+            scores = (vectors @ self.term_index).tocsr()
+            scores.sort_indices()
+        for i in range(len(texts)):
+            start, stop = scores.indptr[i], scores.indptr[i + 1]
+            candidates = scores.indices[start:stop]
+            keep = mask[candidates]
+            ranked.append(self._top_candidates(candidates[keep].astype(np.int32),
+                                               scores.data[start:stop][keep], top_n))
+        return ranked
+
+    def query_text(self, text, category=None, top_n=5, filters=None):
+        # Same result shape as get_similar_products(); category is an engine
+        # category or a category label, None searches the whole catalog
+        with METRICS.request("query_text_seconds"):
+            return self._materialize(self._rank_texts([text], top_n, category, filters)[0])
+
+    def query_text_batch(self, texts, category=None, top_n=5, filters=None):
+        # Columnar like get_similar_products_batch(); "query" is the
+        # position of the text in texts
+        with METRICS.timer("query_text_batch_seconds"):
+            ranked = self._rank_texts(list(texts), top_n, category, filters)
+        counts = np.array([len(r) for r in ranked], dtype=np.int64)
+        flat = [item for r in ranked for item in r]
+        return {
+            "query":    np.repeat(np.arange(len(ranked), dtype=np.int32), counts),
+            "rank":     np.concatenate([np.arange(1, n + 1, dtype=np.int16) for n in counts.tolist()]
+                                       or [np.empty(0, dtype=np.int16)]),
+            "neighbor": np.array([idx for idx, _ in flat], dtype=np.int32),
+            "score":    np.array([score for _, score in flat], dtype=np.float32),
+        }